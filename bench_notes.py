@@ -0,0 +1,672 @@
+"""
+Benchmarks for notes.py
+
+    python bench_notes.py make_styles --fragments 20000 --repeat 5
+    python bench_notes.py notes --lines 10000 100000 --repeat 5 --output runs.jsonl
+
+`notes` generates a synthetic notebook of each size and times the real entry
+points against it. Every result is one JSON object per line so runs can be
+compared.
+"""
+import builtins
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate, count
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from timeit import repeat as time_repeat
+from typing import Callable, Dict, Iterator, List
+
+import colorama
+
+import notes
+
+WORDS = (
+    "the a to of and in is it for on with as at this that be from by not have "
+    "or but are was an will can if all about more when up out what so there "
+    "function class method list dict set tuple import return yield async await "
+    "deploy build release ticket review meeting todo fixme bug issue branch merge"
+).split()
+MARKERS = ["ggg", "yyy", "rrr", "ccc", "bbb", "mmm", "hhh", "<h>", "</h>", "<<<"]
+MARKUP = [
+    "<FORE-fffb00>",
+    "<FORE-3afa00>",
+    "<FORE-ff0000>",
+    "<FORE-78ddff>",
+    "<FORE-00bfff>",
+    "<FORE-8a00b0>",
+    "<FORE-ffffff>",
+]
+OVERLAPPING = [  # fragments where the order of the chained replaces shows
+    "<h>>>>",
+    "<<<h>",
+    "gggmm",
+    "bbbmm x",
+    "rrrmm",
+    "gggmmmm",
+    "</h>>>",
+    "<RESET>>>",
+    "<<<FORE-fffb00>ok",
+    "<FORE-3afa00>mmm",
+    "x<<<<h>>>>mm",
+]
+
+
+def make_styles_chained(line: str) -> str:
+    """
+    `make_styles_chained` reference copy of the chained `str.replace`
+    renderer, for checking and timing other implementations of
+    `notes.make_styles` against
+    """
+    line = (
+        line.replace("<FORE-fffb00>", colorama.Fore.YELLOW)
+        .replace("<FORE-3afa00>", colorama.Fore.GREEN)
+        .replace("<FORE-ff0000>", colorama.Fore.RED)
+        .replace("<FORE-78ddff>", colorama.Fore.CYAN)
+        .replace("<FORE-00bfff>", colorama.Fore.BLUE)
+        .replace("<FORE-8a00b0>", colorama.Fore.MAGENTA)
+        .replace("<FORE-ffffff>", colorama.Fore.WHITE)
+        .replace(">>>", colorama.Fore.GREEN + ">>> ")
+        .replace("ggg", colorama.Fore.GREEN)
+        .replace("yyy", colorama.Fore.YELLOW)
+        .replace("<h>", colorama.Fore.YELLOW)
+        .replace("rrr", colorama.Fore.RED)
+        .replace("ccc", colorama.Fore.CYAN)
+        .replace("bbb", colorama.Fore.BLUE)
+        .replace("mmm", colorama.Fore.MAGENTA)
+        .replace("<FORE-hhhhhh>", colorama.Back.YELLOW + colorama.Fore.MAGENTA)
+        .replace("hhh", colorama.Back.YELLOW + colorama.Fore.MAGENTA)
+        .replace("<<<", colorama.Back.RESET + colorama.Fore.WHITE)
+        .replace("</h>", colorama.Back.RESET + colorama.Fore.WHITE)
+        .replace("<RESET>", colorama.Back.RESET + colorama.Fore.WHITE)
+    )
+    return line
+
+
+def generate_fragments(n: int, seed: int = 0) -> List[str]:
+    """
+    `generate_fragments` rendered-but-unstyled note bodies, as `process_line`
+    hands them to `make_styles`: lowercased words, styled keywords wrapped in
+    <FORE-xxxxxx>KW<RESET>, "+" words highlighted and the odd inline marker
+
+    Parameters
+    ----------
+    `n` : int
+            number of fragments
+    `seed` : int, optional
+            random seed, by default `0`
+
+    Returns
+    -------
+    List[str]
+        fragments
+    """
+    rng = random.Random(seed)
+    fragments = []
+    for _ in range(n):
+        words = []
+        for _ in range(rng.randint(3, 40)):
+            roll = rng.random()
+            if roll < 0.08:
+                words.append(f"{rng.choice(MARKUP)}{rng.choice(WORDS).upper()}<RESET>")
+            elif roll < 0.10:
+                words.append(f"<FORE-hhhhhh>c++{rng.choice(WORDS)}<RESET>")
+            elif roll < 0.13:
+                words.append(f"{rng.choice(MARKERS)}{rng.choice(WORDS)}")
+            elif roll < 0.14:
+                words.append(">>>")
+            else:
+                words.append(rng.choice(WORDS))
+        fragments.append(" ".join(words))
+    return fragments
+
+
+def bench_make_styles(fragments: int, repeat: int) -> Dict:
+    """
+    `bench_make_styles` compares `notes.make_styles` with the chained-replace
+    reference after checking they agree on every fragment and on the
+    `OVERLAPPING` ones
+    """
+    corpus = generate_fragments(fragments)
+    mismatches = [
+        fragment
+        for fragment in corpus + OVERLAPPING
+        if notes.make_styles(fragment) != make_styles_chained(fragment)
+    ]
+    if mismatches:
+        raise AssertionError(f"make_styles differs on {mismatches[0]!r}")
+
+    def run_chained():
+        for fragment in corpus:
+            make_styles_chained(fragment)
+
+    def run_make_styles():
+        for fragment in corpus:
+            notes.make_styles(fragment)
+
+    chained = min(time_repeat(run_chained, number=1, repeat=repeat))
+    current = min(time_repeat(run_make_styles, number=1, repeat=repeat))
+    return {
+        "scenario": "make_styles",
+        "fragments": fragments,
+        "equivalent": True,
+        "chained_s": chained,
+        "make_styles_s": current,
+        "speedup": chained / current,
+    }
+
+
+SCENARIOS = [  # in run order; ensure_redundancy first so its first run is cold
+    "ensure_redundancy",
+    "add_note",
+    "topic",
+    "topic_all",
+    "list",
+    "loop_writes",
+    "import",
+    "scan",
+    "topic_rare",
+    "search_miss",
+    "search_phrase",
+]
+
+
+def generate_notes_file(
+    p: str,
+    lines: int,
+    seed: int = 0,
+    topics: int = 500,
+    zipf_s: float = 1.1,
+    start: datetime = datetime(2015, 1, 1),
+):
+    """
+    `generate_notes_file` writes a synthetic notebook of `lines` notes to `p`,
+    oldest first like the journal
+
+    Topics follow a Zipf distribution over `topics` names (a few very common,
+    a long tail of rare ones), notes carry one to three topics, bodies have a
+    long-tailed number of words split into one or more thoughts, and a slice
+    of the words are keywords styled in `generate_styles_ini`.
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `lines` : int
+            number of notes (10k to 10M is the intended range)
+    `seed` : int, optional
+            random seed, by default `0`
+    `topics` : int, optional
+            number of distinct topics, by default `500`
+    `zipf_s` : float, optional
+            Zipf exponent, by default `1.1`
+    `start` : datetime, optional
+            timestamp of the first note, by default `datetime(2015, 1, 1)`
+    """
+    rng = random.Random(seed)
+    names = topic_names(topics)
+    cumulative = list(accumulate(1 / rank**zipf_s for rank in range(1, topics + 1)))
+    keywords = [name.lower() for name in names[:50]]
+    when = start
+    with open(p, "w") as f:
+        buffer = []
+        for _ in range(lines):
+            when += timedelta(seconds=rng.randint(1, 3600))
+            note_topics = dict.fromkeys(
+                rng.choices(names, cum_weights=cumulative, k=rng.choice((1, 1, 2, 3)))
+            )
+            thoughts = []
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                words = min(int(rng.lognormvariate(2.2, 0.7)) + 1, 120)
+                thoughts.append(
+                    " ".join(
+                        rng.choice(keywords)
+                        if rng.random() < 0.05
+                        else rng.choice(WORDS)
+                        for _ in range(words)
+                    )
+                )
+            buffer.append(
+                f"{when:%Y-%m-%d %H:%M:%S}--{', '.join(note_topics)}::{';'.join(thoughts)}\n"
+            )
+            if len(buffer) >= 10000:
+                f.writelines(buffer)
+                buffer = []
+        f.writelines(buffer)
+
+
+def topic_names(n: int) -> List[str]:
+    """`topic_names` `n` distinct upper-case topic names"""
+    return [f"{WORDS[i % len(WORDS)].upper()}{i // len(WORDS) or ''}" for i in range(n)]
+
+
+def generate_styles_ini(p: str, keywords: int = 300, seed: int = 0):
+    """
+    `generate_styles_ini` writes a styles.ini with `keywords` styled keywords
+
+    Parameters
+    ----------
+    `p` : str
+            styles.ini path
+    `keywords` : int, optional
+            number of keywords, by default `300`
+    `seed` : int, optional
+            random seed, by default `0`
+    """
+    rng = random.Random(seed)
+    with open(p, "w") as f:
+        f.write("; generated by bench_notes.py\n")
+        for name in topic_names(keywords):
+            f.write(f"{name}={rng.choice(MARKUP)}\n")
+
+
+@contextmanager
+def notes_sandbox(workdir: str) -> Iterator[None]:
+    """
+    `notes_sandbox` points notes.py at `workdir` (ini, redundancy, styles,
+    render cache and the notes file itself) and sends its output to os.devnull
+    """
+    saved = (
+        notes.INIT_FILE,
+        notes.REDUNDANCY_PATH,
+        notes.STYLES_PATH,
+        notes.STYLES,
+        notes.RENDER_CACHE,
+        os.getcwd(),
+        sys.argv,
+        sys.stdin,
+        sys.stdout,
+        builtins.input,
+    )
+    notes.INIT_FILE = os.path.join(workdir, "notes_init.ini")
+    notes.REDUNDANCY_PATH = os.path.join(workdir, "redundancy.txt")
+    notes.STYLES_PATH = os.path.join(workdir, "styles.ini")
+    notes.STYLES = notes.StyleRegistry(notes.STYLES_PATH)
+    notes.RENDER_CACHE = notes.RenderCache(
+        os.path.join(workdir, "render_cache.sqlite3")
+    )
+    os.chdir(workdir)
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            notes.STYLES.flush()
+            notes.RENDER_CACHE.close()
+            (
+                notes.INIT_FILE,
+                notes.REDUNDANCY_PATH,
+                notes.STYLES_PATH,
+                notes.STYLES,
+                notes.RENDER_CACHE,
+                cwd,
+                sys.argv,
+                sys.stdin,
+                sys.stdout,
+                builtins.input,
+            ) = saved
+            os.chdir(cwd)
+
+
+def run_cli(*argv: str, inputs: List[str] = ()):
+    """`run_cli` runs `notes.main()` as if called with `argv`, answering
+    `input()` prompts from `inputs`"""
+    answers = iter(inputs)
+    builtins.input = lambda prompt="": next(answers, "-e")
+    sys.stdin = io.StringIO()  # not a pipe: the loop mode asks `input` too
+    sys.argv = ["notes.py", *argv]
+    notes.main()
+
+
+def scan_notes(p: str, word: str) -> int:
+    """`scan_notes` counts the lines of `p` containing `word`: the plain
+    substring scan that the `topic_rare` and `search_*` index lookups (timed
+    without rendering) compete with"""
+    with open(p, "r", encoding="utf-8") as f:
+        return sum(word in line for line in f)
+
+
+def count_notes(notes_found: Iterator) -> int:
+    """`count_notes` consumes a query"""
+    return sum(1 for _ in notes_found)
+
+
+def time_scenario(run: Callable[[], None], repeat: int) -> Dict:
+    """`time_scenario` times `run` `repeat` times; the first (cold: indexes
+    and checkpoints not built yet) run is reported separately"""
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        run()
+        timings.append(perf_counter() - started)
+    warm = timings[1:] or timings
+    return {
+        "first_s": timings[0],
+        "min_s": min(warm),
+        "median_s": median(warm),
+        "max_s": max(warm),
+        "runs": repeat,
+    }
+
+
+def bench_notes(
+    lines: int, scenarios: List[str], repeat: int, seed: int
+) -> Iterator[Dict]:
+    """
+    `bench_notes` times `scenarios` against a generated notebook of `lines`
+    notes
+
+    Parameters
+    ----------
+    `lines` : int
+            notebook size
+    `scenarios` : List[str]
+            names from `SCENARIOS`
+    `repeat` : int
+            runs per scenario
+    `seed` : int
+            random seed for the generator
+
+    Yields
+    ------
+    Dict
+        one result per scenario
+    """
+    with TemporaryDirectory() as workdir:
+        notes_path = os.path.join(workdir, "bench_notes.txt")
+        started = perf_counter()
+        generate_notes_file(notes_path, lines, seed)
+        generate_styles_ini(os.path.join(workdir, "styles.ini"), seed=seed)
+        generated_s = perf_counter() - started
+        common_topic = topic_names(1)[0]
+        rare_topic = topic_names(50)[-1]  # rarest topic that is also a keyword
+        store = notes.open_store(notes_path)
+        import_paths = (os.path.join(workdir, f"import_{i}.txt") for i in count())
+
+        runs = {
+            "add_note": lambda: run_cli(
+                "-f", notes_path, "-n", "benchmark", "note", "-t", common_topic
+            ),
+            "topic": lambda: run_cli("-f", notes_path, "-t", common_topic),
+            "topic_all": lambda: run_cli("-f", notes_path, "-t", "ALL"),
+            "list": lambda: run_cli("-f", notes_path),
+            "ensure_redundancy": lambda: notes.ensure_redundancy(
+                notes.REDUNDANCY_PATH, notes_path
+            ),
+            "loop_writes": lambda: run_cli(
+                "-f",
+                notes_path,
+                "-l",
+                inputs=[x for i in range(20) for x in ("-s", f"loop note {i}")],
+            ),
+            "import": lambda: run_cli("-f", next(import_paths), "--import", notes_path),
+            "scan": lambda: scan_notes(notes_path, "zyzzyva"),
+            "topic_rare": lambda: count_notes(store.by_topics([rare_topic])),
+            "search_miss": lambda: count_notes(store.search("zyzzyva")),
+            "search_phrase": lambda: count_notes(
+                store.search(f'"{rare_topic.lower()} the"')
+            ),
+        }
+        with notes_sandbox(workdir):
+            for scenario in scenarios:
+                result = {
+                    "scenario": scenario,
+                    "lines": lines,
+                    "seed": seed,
+                    "file_bytes": os.path.getsize(notes_path),
+                    "generate_s": generated_s,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                }
+                result.update(time_scenario(runs[scenario], repeat))
+                yield result
+
+
+def write_notes_worker(workdir: str, notes_path: str, worker: int, count: int):
+    """`write_notes_worker` one of the concurrent writers of `bench_writers`"""
+    with notes_sandbox(workdir):
+        for i in range(count):
+            run_cli("-f", notes_path, "-n", f"writer {worker} note {i}", "-t", "BENCH")
+
+
+def bench_writers(
+    writers: List[int], notes_per_writer: int, lines: int, seed: int
+) -> Iterator[Dict]:
+    """
+    `bench_writers` times N processes adding notes to one notebook at once,
+    each through the full CLI path, and checks that no note was lost
+
+    Parameters
+    ----------
+    `writers` : List[int]
+            numbers of parallel writers to try
+    `notes_per_writer` : int
+            notes each writer adds, one `notes.py -n` per note
+    `lines` : int
+            size of the notebook written to
+    `seed` : int
+            random seed for the generator
+
+    Yields
+    ------
+    Dict
+        one result per number of writers
+    """
+    for n in writers:
+        with TemporaryDirectory() as workdir:
+            notes_path = os.path.join(workdir, "bench_notes.txt")
+            generate_notes_file(notes_path, lines, seed)
+            with notes_sandbox(workdir):  # build indexes and first backup up front
+                run_cli("-f", notes_path, "-n", "warm up", "-t", "BENCH")
+            with ProcessPoolExecutor(n) as pool:
+                list(pool.map(abs, range(n)))  # start the workers before timing
+                started = perf_counter()
+                jobs = [
+                    pool.submit(
+                        write_notes_worker, workdir, notes_path, i, notes_per_writer
+                    )
+                    for i in range(n)
+                ]
+                for job in jobs:
+                    job.result()
+                elapsed = perf_counter() - started
+            with open(notes_path) as f:
+                written = sum(
+                    line.startswith("20") and "::writer " in line for line in f
+                )
+            yield {
+                "scenario": "writers",
+                "writers": n,
+                "notes": n * notes_per_writer,
+                "lost": n * notes_per_writer - written,
+                "lines": lines,
+                "elapsed_s": elapsed,
+                "notes_per_s": n * notes_per_writer / elapsed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+            }
+
+
+def bench_notebooks(
+    workers: List[int], notebooks: int, lines: int, repeat: int, seed: int
+) -> Iterator[Dict]:
+    """
+    `bench_notebooks` times one query over many notebooks
+    (`notes.query_notebooks`) with different numbers of worker processes, and
+    checks that every pool size returns the same notes
+
+    Parameters
+    ----------
+    `workers` : List[int]
+            pool sizes to try
+    `notebooks` : int
+            number of notebooks queried
+    `lines` : int
+            notes per notebook
+    `repeat` : int
+            runs per query, best taken
+    `seed` : int
+            random seed for the generator
+
+    Yields
+    ------
+    Dict
+        one result per query and pool size
+    """
+    queries = {
+        "topic": {"topics": [topic_names(2)[1]]},
+        "search": {"query": "deploy release"},
+        "since": {"since": "2015-01-15 00:00:00", "topics": [topic_names(1)[0]]},
+    }
+    with TemporaryDirectory() as workdir:
+        paths = [
+            os.path.join(workdir, f"notebook{i:04d}.txt") for i in range(notebooks)
+        ]
+        for i, p in enumerate(paths):
+            generate_notes_file(p, lines, seed + i)
+        with notes_sandbox(workdir):
+            for name, query in queries.items():  # build the indexes up front
+                expected = [
+                    note.timestamp for note in notes.query_notebooks(paths, 1, **query)
+                ]
+                for n in workers:
+                    times = []
+                    for _ in range(repeat):
+                        started = perf_counter()
+                        found = [
+                            note.timestamp
+                            for note in notes.query_notebooks(paths, n, **query)
+                        ]
+                        times.append(perf_counter() - started)
+                    yield {
+                        "scenario": "notebooks",
+                        "query": name,
+                        "workers": n,
+                        "notebooks": notebooks,
+                        "lines": lines,
+                        "matches": len(found),
+                        "same_results": found == expected,
+                        "best_s": min(times),
+                        "median_s": median(times),
+                        "cpus": os.cpu_count(),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                    }
+
+
+STARTUP_BUDGET_MS = {"import_notes": 40, "version": 80}  # see bench_startup
+
+
+def bench_startup(repeat: int) -> Dict:
+    """
+    `bench_startup` measures what a short command like `notes.py -v` pays
+    before doing any work, against `STARTUP_BUDGET_MS`
+
+    `import_notes_ms` is the cumulative import time of notes.py as reported by
+    `python -X importtime`, so it excludes interpreter start-up; `version_ms`
+    is the wall time of a whole `python notes.py -v` process. Both take the
+    best of `repeat` runs, the first of which compiles notes.py.
+
+    Parameters
+    ----------
+    `repeat` : int
+            runs per measurement
+
+    Returns
+    -------
+    Dict
+        timings, budgets and `within_budget`
+    """
+    here = os.path.dirname(os.path.abspath(notes.__file__))
+    imports, versions = [], []
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import notes"],
+            cwd=here,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+        line = next(x for x in stderr.splitlines() if x.endswith("| notes"))
+        imports.append(int(line.split("|")[1]) / 1000)
+        started = perf_counter()
+        subprocess.run(
+            [sys.executable, "notes.py", "-v"],
+            cwd=here,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        versions.append((perf_counter() - started) * 1000)
+    result = {
+        "scenario": "startup",
+        "import_notes_ms": min(imports),
+        "version_ms": min(versions),
+        "budget_ms": STARTUP_BUDGET_MS,
+        "runs": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    result["within_budget"] = all(
+        result[f"{name}_ms"] <= budget for name, budget in STARTUP_BUDGET_MS.items()
+    )
+    return result
+
+
+def main():
+    parser = ArgumentParser(description="notes.py benchmarks")
+    parser.add_argument(
+        "scenario", choices=["make_styles", "notebooks", "notes", "startup", "writers"]
+    )
+    parser.add_argument("--fragments", type=int, default=20000)
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--notes-per-writer", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--notebooks", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="append results to this file (JSON lines)")
+    args = parser.parse_args()
+
+    if args.scenario == "make_styles":
+        results = [bench_make_styles(args.fragments, args.repeat)]
+    elif args.scenario == "startup":
+        results = [bench_startup(args.repeat)]
+    elif args.scenario == "writers":
+        results = bench_writers(
+            args.writers, args.notes_per_writer, args.lines[0], args.seed
+        )
+    elif args.scenario == "notebooks":
+        results = bench_notebooks(
+            args.workers, args.notebooks, args.lines[0], args.repeat, args.seed
+        )
+    else:
+        results = (
+            result
+            for lines in args.lines
+            for result in bench_notes(lines, args.scenarios, args.repeat, args.seed)
+        )
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        for result in results:
+            json.dump(result, out)
+            out.write("\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,346 @@
-import argparse
-from argparse import ArgumentParser
+import atexit
+import json
+import sys
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from getpass import getuser
-from os import makedirs, path, startfile
-from re import finditer, match
-from shutil import copy2
-from typing import Any, Dict, List
+from functools import lru_cache, partial
+from locale import getpreferredencoding
+from mmap import ACCESS_READ, mmap
+from os import (
+    SEEK_END,
+    chdir,
+    environ,
+    getcwd,
+    getpid,
+    linesep,
+    listdir,
+    makedirs,
+    path,
+    read as read_fd,
+    remove,
+    replace,
+    stat,
+)
+from re import compile as compile_regex
+from re import findall, match
+from time import monotonic, perf_counter, time_ns
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+)
 
-import colorama
+if TYPE_CHECKING:  ##annotations only: imported where the parser or the loop is built
+    import argparse
+    import asyncio
 
-colorama.init(convert=True)  # windows specific?
+
+def load_colorama():
+    """
+    `load_colorama` imports colorama and wraps stdout, the first time colour
+    is needed rather than on every start-up
+
+    Call before picking up `sys.stdout` for output, since colorama replaces it.
+    """
+    global colorama
+    if isinstance(colorama, LazyColorama):
+        import colorama as module
+
+        module.init(convert=True)  # windows specific?
+        colorama = module
+    return colorama
+
+
+class LazyColorama:
+    """`LazyColorama` stands in for colorama until first used"""
+
+    def __getattr__(self, name: str):
+        return getattr(load_colorama(), name)
+
+
+colorama = LazyColorama()
 
 THIS_DIR = path.dirname(path.abspath(__file__))
 
 INIT_FILE = r"{}\notes_init.ini".format(THIS_DIR)
 REDUNDANCY_PATH = r"{}\redundancy.txt".format(THIS_DIR)
+STYLES_PATH = path.join(THIS_DIR, "styles.ini")
+RENDER_CACHE_PATH = path.join(THIS_DIR, "render_cache.sqlite3")
+DAEMON_SOCKET = environ.get("NOTES_SOCKET", path.join(THIS_DIR, "notes.sock"))
+SERVING = False  ##True inside the daemon, so main() never forwards to itself
+
+ENCODING = getpreferredencoding(False)  # what open() uses for the notes file
+TIMESTAMP_REGEX = r"\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}"
+WORD_REGEX = r"\w+"
+NOTE_MATCH = compile_regex(rf"({TIMESTAMP_REGEX})--(.*?)::(.*)").match
+TIMESTAMP_PREFIX = compile_regex(TIMESTAMP_REGEX.encode()).match  # on mmap bytes
 
 version = 0.3
 
 
+class Profiler:
+    """
+    `Profiler` named timing spans, reported on exit when enabled
+
+    Enabled by `--profile [text|json|path.json]` or the NOTES_PROFILE
+    environment variable (same values). When disabled, `span` returns a shared
+    no-op context manager and `iterate` returns its argument untouched.
+
+    Example
+    -------
+        `Profiler` usage:
+    ```python
+        >>> with PROFILER.span("render"):
+        ...     render_note(note, d)
+        >>> notes = PROFILER.iterate("read", get_notes("mynotes.txt"))
+    ```
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.destination = "text"
+        self.started = None
+        self.spans = {}  # name -> [calls, total seconds, max seconds]
+
+    def enable(self, destination: str = "text"):
+        """start collecting spans; `destination` is text, json or a .json path"""
+        self.enabled = True
+        self.destination = destination or "text"
+        self.started = perf_counter()
+
+    def span(self, name: str):
+        """context manager timing one call of `name`"""
+        return self._span(name) if self.enabled else NULL_SPAN
+
+    @contextmanager
+    def _span(self, name: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - started)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterable:
+        """time how long `iterable` takes to produce items (not consume them)"""
+        return self._iterate(name, iterable) if self.enabled else iterable
+
+    def _iterate(self, name: str, iterable: Iterable) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            started = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, perf_counter() - started)
+                return
+            self.add(name, perf_counter() - started)
+            yield item
+
+    def add(self, name: str, seconds: float):
+        """record one call of `name` that took `seconds`"""
+        stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+    def as_dict(self) -> Dict:
+        """spans as {"wall_s": float, "spans": {name: {calls, total_s, max_s}}}"""
+        return {
+            "wall_s": perf_counter() - self.started,
+            "spans": {
+                name: {"calls": calls, "total_s": total, "max_s": longest}
+                for name, (calls, total, longest) in self.spans.items()
+            },
+        }
+
+    def report(self):
+        """write the timing breakdown to stderr, or to a .json file"""
+        if not self.enabled:
+            return
+        summary = self.as_dict()
+        if self.destination == "json":
+            json.dump(summary, sys.stderr)
+            sys.stderr.write("\n")
+        elif self.destination.endswith(".json"):
+            with open(self.destination, "w") as f:
+                json.dump(summary, f, indent=2)
+        else:
+            rows = sorted(summary["spans"].items(), key=lambda i: -i[1]["total_s"])
+            sys.stderr.write(
+                f"\n{'span':<24}{'calls':>8}{'total ms':>12}{'max ms':>10}\n"
+            )
+            for name, stats in rows:
+                sys.stderr.write(
+                    f"{name:<24}{stats['calls']:>8}"
+                    f"{stats['total_s'] * 1000:>12.2f}{stats['max_s'] * 1000:>10.2f}\n"
+                )
+            sys.stderr.write(f"{'wall':<24}{'':>8}{summary['wall_s'] * 1000:>12.2f}\n")
+
+
+NULL_SPAN = nullcontext()
+PROFILER = Profiler()
+
+
+def configure_profiler(argv: List[str], environ: Dict[str, str]):
+    """
+    `configure_profiler` enables `PROFILER` from --profile or NOTES_PROFILE
+
+    Runs before the argument parser is built, so startup is timed as well.
+
+    Parameters
+    ----------
+    `argv` : List[str]
+            command-line arguments
+    `environ` : Dict[str, str]
+            environment variables
+
+    Example
+    -------
+        `configure_profiler` usage:
+    ```python
+        >>> configure_profiler(["--profile", "json"], os.environ)
+    ```
+    """
+    destination = profile_flag(argv) or environ.get("NOTES_PROFILE")
+    if destination:
+        PROFILER.enable(destination)
+
+
+def profile_flag(argv: List[str]) -> Optional[str]:
+    """
+    `profile_flag` DEST of --profile in `argv` ("text" if given without
+    one), read the way the full parser will read it: "--profile=json" and
+    abbreviations such as "--prof json" included
+
+    Example
+    -------
+        `profile_flag` usage:
+    ```python
+        >>> profile_flag(["-t", "py", "--prof=json"])
+        "json"
+    ```
+    """
+    if not any(arg.startswith("--p") for arg in argv):  ##skip argparse otherwise
+        return None
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("--profile", nargs="?", const="text")
+    known, _ = parser.parse_known_args(argv)
+    return known.profile
+
+
+def report_profile():
+    """`report_profile` reports `PROFILER` spans at exit, after styles flush"""
+    PROFILER.report()
+
+
+atexit.register(report_profile)  # registered before flush_styles, so runs after it
+
+
+HELD_LOCKS = {}  ##lock path -> [open lock file, depth]; see notes_lock
+
+
+@contextmanager
+def notes_lock(p: str) -> Iterator[None]:
+    """
+    `notes_lock` holds an exclusive inter-process lock on file `p` (taken on
+    `p`.lock) for the body of the `with`; re-entrant within a process
+
+    Whatever reads and then rewrites or appends to a notes file or one of its
+    sidecars (indexes, backups, the redundancy mirror, styles.ini) does so
+    under the lock of that file, so concurrent notes.py processes queue up
+    instead of losing each other's writes.
+
+    Example
+    -------
+        `notes_lock` usage:
+    ```python
+        >>> with notes_lock("mynotes.txt"):
+        ...     append_note("mynotes.txt", "2021-03-01 09:30:00--misc::buy milk")
+    ```
+    """
+    lock_path = path.abspath(f"{p}.lock")
+    held = HELD_LOCKS.get(lock_path)
+    if held is not None:
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+        return
+    f = open(lock_path, "a+b")
+    try:
+        with PROFILER.span("lock.wait"):
+            lock_file(f)
+        HELD_LOCKS[lock_path] = [f, 1]
+        try:
+            yield
+        finally:
+            del HELD_LOCKS[lock_path]
+            unlock_file(f)
+    finally:
+        f.close()
+
+
+def lock_file(f):
+    """`lock_file` blocks until this process holds the lock on open file `f`"""
+    try:
+        import fcntl
+    except ImportError:  ##windows
+        import msvcrt
+
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s
+                return
+            except OSError:
+                continue
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def unlock_file(f):
+    """`unlock_file` releases the lock taken by `lock_file`"""
+    try:
+        import fcntl
+    except ImportError:  ##windows
+        import msvcrt
+
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomic(p: str, text: str, encoding: str = None):
+    """
+    `write_atomic` replaces the contents of `p` with `text` in one step:
+    readers see the old file or the new one, never a partial write
+    """
+    temp_path = f"{p}.{getpid()}.tmp"
+    with open(temp_path, "w", encoding=encoding) as f:
+        f.write(text)
+    replace(temp_path, p)
+
+
 def ensure_redundancy(path_redundant: str, path_notes: str):
     """
     `ensure_redundancy` writes all notes to backup `path_redundant`
 
+    Only notes added since the last run are handled: a checkpoint
+    (`path_redundant`.ckpt) records how far each notes file has been mirrored,
+    and a key index (`path_redundant`.idx) holds the timestamp--topics prefix
+    of every mirrored note, so duplicates are found with a set lookup.
+
     Parameters
     ----------
     `path_redundant` : str
@@ -37,17 +355,167 @@ def ensure_redundancy(path_redundant: str, path_notes: str):
         >>> ensure_redundancy("path/to/redundant_file.txt", "path/to/default_notes.txt")
     ```
     """
+    if not path.isfile(path_notes):
+        return
+    if not isinstance(open_store(path_notes), TextStore):  ##transactional already
+        return
+    with notes_lock(path_redundant):  ##one mirror, many notes.py processes
+        ensure_journal(path_notes)
+        checkpoint = load_redundancy_checkpoint(path_redundant)
+        notes_key = path.abspath(path_notes)
+        mark = checkpoint["notes"].get(notes_key, {})
+        with open(path_notes, "rb") as f:
+            head = f.readline().decode(ENCODING, errors="replace")
+            size = f.seek(0, SEEK_END)
+            offset = mark.get("offset", 0)
+            if mark.get("head") != head or offset > size:  # file was replaced
+                offset = 0
+            if offset == size:  # nothing new since last run
+                return
+            f.seek(offset)
+            new_bytes = f.read(size - offset)
+        new_bytes = new_bytes[: new_bytes.rfind(b"\n") + 1]  # complete lines only
+
+        redundant_keys = load_redundancy_index(path_redundant, checkpoint)
+        new_lines, new_keys = [], []
+        for this_line in new_bytes.decode(ENCODING, errors="replace").splitlines():
+            this_line = this_line.rstrip("\r")
+            key = redundancy_key(this_line)
+            if not key or key in redundant_keys:
+                continue
+            redundant_keys.add(key)
+            new_lines.append(this_line + "\n")
+            new_keys.append(key + "\n")
+        if new_lines:
+            with open(path_redundant, "a") as f:
+                f.writelines(new_lines)
+            with open(f"{path_redundant}.idx", "a") as f:
+                f.writelines(new_keys)
+
+        checkpoint["redundancy_size"] = (
+            path.getsize(path_redundant) if path.isfile(path_redundant) else 0
+        )
+        checkpoint["notes"][notes_key] = {
+            "offset": offset + len(new_bytes),
+            "head": head,
+        }
+        save_redundancy_checkpoint(path_redundant, checkpoint)
+
+
+def redundancy_key(line: str) -> str:
+    """
+    `redundancy_key` identifies a note by its timestamp and topics
+
+    Parameters
+    ----------
+    `line` : str
+            note
+
+    Returns
+    -------
+    str
+        "timestamp--TOPIC, TOPIC" (empty if `line` is not a note)
+
+    Example
+    -------
+        `redundancy_key` usage:
+    ```python
+        >>> redundancy_key("2021-03-01 09:30:00--misc::buy milk")
+        "2021-03-01 09:30:00--MISC"
+    ```
+    """
+    note = parse_note(line)
+    return "" if note is None else f"{note.timestamp}--{', '.join(note.topics)}"
 
-    redundant_lines = get_lines(path_redundant)
-    these_lines = get_lines(path_notes)
-    for this_line in these_lines:
-        for redundant_line in redundant_lines:
-            if this_line.split("--")[0] in redundant_line:
-                break
-        else:
-            redundant_lines.append(this_line)
-    with open(path_redundant, "w") as f:
-        f.writelines(redundant_lines)
+
+def load_redundancy_checkpoint(path_redundant: str) -> Dict:
+    """
+    `load_redundancy_checkpoint` reads `path_redundant`.ckpt
+
+    Parameters
+    ----------
+    `path_redundant` : str
+            file path
+
+    Returns
+    -------
+    Dict
+        {"redundancy_size": int, "notes": {notes path: {"offset", "head"}}}
+
+    Example
+    -------
+        `load_redundancy_checkpoint` usage:
+    ```python
+        >>> load_redundancy_checkpoint(REDUNDANCY_PATH)
+        {"redundancy_size": 0, "notes": {}}
+    ```
+    """
+    try:
+        with open(f"{path_redundant}.ckpt", "r") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        checkpoint = {}
+    checkpoint.setdefault("redundancy_size", -1)
+    checkpoint.setdefault("notes", {})
+    return checkpoint
+
+
+def save_redundancy_checkpoint(path_redundant: str, checkpoint: Dict):
+    """
+    `save_redundancy_checkpoint` writes `checkpoint` to `path_redundant`.ckpt
+
+    Parameters
+    ----------
+    `path_redundant` : str
+            file path
+    `checkpoint` : Dict
+            see `load_redundancy_checkpoint`
+    """
+    temp_path = f"{path_redundant}.ckpt.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f)
+    replace(temp_path, f"{path_redundant}.ckpt")
+
+
+def load_redundancy_index(path_redundant: str, checkpoint: Dict) -> Set[str]:
+    """
+    `load_redundancy_index` keys of every note already in `path_redundant`
+
+    The index is rebuilt from `path_redundant` when it is missing or the
+    redundancy file changed size behind our back.
+
+    Parameters
+    ----------
+    `path_redundant` : str
+            file path
+    `checkpoint` : Dict
+            see `load_redundancy_checkpoint`
+
+    Returns
+    -------
+    Set[str]
+        keys (see `redundancy_key`)
+
+    Example
+    -------
+        `load_redundancy_index` usage:
+    ```python
+        >>> load_redundancy_index(REDUNDANCY_PATH, checkpoint)
+        {"2021-03-01 09:30:00--misc", ...}
+    ```
+    """
+    index_path = f"{path_redundant}.idx"
+    redundancy_size = path.getsize(path_redundant) if path.isfile(path_redundant) else 0
+    if path.isfile(index_path) and checkpoint["redundancy_size"] == redundancy_size:
+        with open(index_path, "r") as f:
+            return {line.rstrip("\n") for line in f}
+
+    keys = {redundancy_key(line) for line in get_lines(path_redundant)}
+    keys.discard("")
+    with open(index_path, "w") as f:
+        f.writelines(f"{key}\n" for key in keys)
+    checkpoint["redundancy_size"] = redundancy_size
+    return keys
 
 
 def get_lines(p: str) -> List[str]:
@@ -84,7 +552,7 @@ def get_lines(p: str) -> List[str]:
     return lines
 
 
-def get_attr_by_flag(args: argparse.Namespace, d: Dict, flag_key: str) -> Any:
+def get_attr_by_flag(args: "argparse.Namespace", d: Dict, flag_key: str) -> Any:
     """
     `get_attr_by_flag` does what it says
 
@@ -133,7 +601,16 @@ def main():
         >>> if __name__=="__main__": main()
     ```
     """
-    d, args = process_init()
+    if sys.argv[1:] in (["-v"], ["--version"]):  ##nothing else to set up
+        print("Notes > Memory, version:{}".format(version))
+        return
+
+    if forward_to_daemon(sys.argv[1:]):  ##answered from memory by `serve`
+        return
+
+    configure_profiler(sys.argv[1:], environ)
+    with PROFILER.span("process_init"):
+        d, args = process_init()
 
     user_file_path = get_attr_by_flag(args, d, "default_defaultfile_flags")
     default_file_path = get_attr_by_flag(args, d, "default_changefilename_flags")
@@ -144,12 +621,28 @@ def main():
     )  # could be None or list of passed in topics
     # print(dir(args))
     this_version = getattr(args, "version")
+    search_query = getattr(args, "search")
+    export_path = getattr(args, "export")
+    restore_from = getattr(args, "restore")
+    import_from = getattr(args, "import")
+    stats_format = getattr(args, "stats")
+    archive_age = getattr(args, "archive")
+    since, until = getattr(args, "since"), getattr(args, "until")
+    linebreak = d.get("default_linebreak", ";")
+    store = open_store(default_file_path)
+
+    if getattr(args, "daemon") is True:  ##stay resident; see forward_to_daemon
+        serve(DAEMON_SOCKET, warm=[default_file_path])
+        return
 
-    ensure_redundancy(REDUNDANCY_PATH, default_file_path)
+    with PROFILER.span("ensure_redundancy"):
+        ensure_redundancy(REDUNDANCY_PATH, default_file_path)
 
     if open_default_file is True:  ##launch default file
         if path.isfile(d.get("default_file")):
             print("Opening {}".format(d.get("default_file")))
+            from os import startfile  # windows only
+
             startfile("{}".format(d.get("default_file")))
         else:
             print(f'{d.get("default_file")} not found.')
@@ -159,6 +652,99 @@ def main():
         print("Notes > Memory, version:{}".format(version))
         return
 
+    if export_path is not None:  ##copy notes to another file or database
+        try:
+            count = export_notes(store, open_store(export_path))
+        except FileExistsError as exc:
+            print(f"\n\t{exc}; export to a new file.")
+            return
+        print(f"Exported {count} notes from {default_file_path} to {export_path}")
+        return
+
+    if import_from is not None:  ##bulk add notes from a file or stdin
+        if import_from != "-" and not path.isfile(import_from):
+            print(f"\n\tNo such file or directory: {import_from}")
+            return
+        source = (
+            sys.stdin
+            if import_from == "-"
+            else open(import_from, "r", encoding=ENCODING, errors="replace")
+        )
+        notes, rejected = [], []
+        with source, PROFILER.span("import.read"):
+            for number, record in enumerate(source, 1):
+                note = normalize_record(record, linebreak)
+                if note is not None:
+                    notes.append(note)
+                elif record.strip():
+                    rejected.append(number)
+        if rejected:
+            print(
+                f"Skipped {len(rejected)} invalid records, on line(s) "
+                + ", ".join(map(str, rejected[:10]))
+                + (", ..." if len(rejected) > 10 else ""),
+                file=sys.stderr,
+            )
+        if notes:
+            merged = import_notes(store, notes, d)
+            print(
+                f"Imported {len(notes)} notes into {default_file_path}"
+                + (", merged into time order" if merged else "")
+            )
+        return
+
+    if stats_format is not None:  ##topic and time summary
+        if not store.exists():
+            print(f"\n\tNo such file or directory: {(default_file_path)}")
+            return
+        with PROFILER.span("stats"):
+            stats = store.stats()
+        show_stats(stats, default_file_path, stats_format)
+        return
+
+    if archive_age is not None:  ##roll old notes into compressed segments
+        if not isinstance(store, TextStore):
+            print(
+                f"\n\t{default_file_path} is a database; only text notes files are archived."
+            )
+            return
+        if not store.exists():
+            print(f"\n\tNo such file or directory: {(default_file_path)}")
+            return
+        try:
+            before = parse_when(archive_age)
+        except ValueError as exc:
+            print(
+                f"\n\t{exc}; use an age (i.e.: 26w, 365d) or a date (i.e.: 2021-01-01)"
+            )
+            return
+        count = archive_notes(store, before)
+        print(
+            f"Archived {count} notes from before {before} to {archive_dir(default_file_path)}"
+        )
+        return
+
+    if restore_from == "list":  ##show backup generations
+        generations = load_backup_manifest(default_file_path)["generations"]
+        print(f"Backups of {default_file_path} (newest last):")
+        for generation in generations:
+            print(f"\t{generation['name']}\t+{generation['records']} notes")
+        return
+
+    if restore_from is not None:  ##rebuild notes file from backups
+        kept = store.exists()
+        try:
+            name = restore_notes(
+                store, None if restore_from == "latest" else restore_from
+            )
+        except FileNotFoundError as exc:
+            print(f"\n\t{exc}; see --restore list.")
+            return
+        print(f"Restored {default_file_path} from backup {name}")
+        if kept:
+            print(f"Previous contents kept in {default_file_path}.before-restore")
+        return
+
     if (user_file_path) != d[
         "default_file"
     ]:  ##user changing defaultfile; update INIT_FILE
@@ -170,6 +756,8 @@ def main():
             for i in lines
         ]
 
+        from shutil import copy2
+
         try:
             notes_copy_path = path.join(
                 path.split(INIT_FILE)[0], f"COPY - {path.split(INIT_FILE)[1]}"
@@ -181,8 +769,7 @@ def main():
         except FileNotFoundError:
             print(f"Creating {INIT_FILE}")
 
-        with open(INIT_FILE, "w") as f:
-            f.writelines(NEW_INIT_FILE)
+        write_atomic(INIT_FILE, "".join(NEW_INIT_FILE))
 
         print("Default file changed to {}".format(user_file_path))
         return
@@ -191,230 +778,3352 @@ def main():
         process_loop(args, init_dict=d)
         return
 
+    try:  ##--since/--until as note timestamps
+        since = since and parse_when(since)
+        until = until and parse_when(until, end=True)
+    except ValueError as exc:
+        print(
+            f"\n\t{exc}; use a date (i.e.: 2021-03-01), a time "
+            "(i.e.: 2021-03-01 09:30) or an age (i.e.: 12h, 7d, 2w)"
+        )
+        return
+    dated = since is not None or until is not None
+
+    notebooks = getattr(args, "notebooks")
+    if notebooks is not None:  ##one query over many notes files
+        paths = expand_notebooks(notebooks)
+        if not paths:
+            print(f"\n\tNo such file or directory: {' '.join(notebooks)}")
+            return
+        if topics is not None and "ALL" in topics:
+            tags = set().union(*(open_store(p).tags() for p in paths))
+            topics = show_all_topics(topics, tags, ", ".join(paths))
+        matches = query_notebooks(
+            paths,
+            query=" ".join(search_query) if search_query is not None else None,
+            topics=topics,
+            since=since,
+            until=until,
+            linebreak=linebreak,
+        )
+        if search_query is None and topics is None:
+
+            def seek(stamp: str) -> Iterator[Note]:
+                until_stamp = min(until or stamp, stamp)
+                return query_notebooks(
+                    paths, since=since, until=until_stamp, linebreak=linebreak
+                )
+
+            show_non_specific_lines(PROFILER.iterate("read", matches), d, seek)
+        else:
+            write_chunks(render_notes(PROFILER.iterate("read", matches), d))
+        return
+
+    if search_query is not None:  ##full-text search
+        matches = store.search(" ".join(search_query), topics, linebreak)
+        if dated:
+            matches = within(matches, since, until)
+        write_chunks(render_notes(PROFILER.iterate("read", matches), d))
+        return
+
     if (
         getattr(args, d.get("default_note_flags")[-1].strip())
     ) is None:  ##no note means user wants note output
-        try:
-            lines = get_lines_from_path(default_file_path)
-        except FileNotFoundError:
+        if not store.exists():
             print(
                 f"\n\tNo such file or directory: {(default_file_path)}\n\t>>Add notes to file before using topic tag."
             )
             return
 
-        if topics is None:
-            show_non_specific_lines(lines, d)
-            return
-        if "ALL" in topics:
-            topics = show_all_topics(topics, lines, default_file_path)
-        for i, line in enumerate(lines):
-            if sum([1 for t in topics if t in line.split("::")[0]]) > 0:
-                process_line(line, d)
-        return
+        if topics is None:
+            matches = (
+                store.between(since, until, linebreak=linebreak)
+                if dated
+                else store.notes(linebreak)
+            )
+
+            def seek(stamp: str) -> Iterator[Note]:
+                until_stamp = min(until or stamp, stamp)
+                return store.between(since, until_stamp, linebreak=linebreak)
+
+            show_non_specific_lines(PROFILER.iterate("read", matches), d, seek)
+            return
+        if "ALL" in topics:
+            topics = show_all_topics(topics, store.tags(), default_file_path)
+        matches = (
+            store.between(since, until, topics, linebreak)
+            if dated
+            else store.by_topics(topics, linebreak)
+        )
+        write_chunks(render_notes(PROFILER.iterate("read", matches), d))
+        return
+
+    note_str = " ".join(
+        (getattr(args, d.get("default_note_flags")[-1].strip()))
+    )  ##(getattr(args, d.get("default_note_flags")[-1].strip())) comes in as a list; convert to string
+
+    if not store.exists():
+        print(f"Creating {(default_file_path)}")
+    for topic in topics or []:
+        show_all_flags = ["ALL", "SHOW", "HELP", "TOPICS"]
+        if topic in show_all_flags:
+            topics.remove(topic)
+            ticker_set = set()
+            if not store.exists():
+                print(
+                    f"\n\tNo such file or directory: {(default_file_path)}\n\t>>Add notes to file before using topic tag."
+                )
+            else:
+                ticker_set = store.tags()
+            print(
+                "\n  Current Topics in {}:".format(default_file_path)
+                + colorama.Fore.MAGENTA
+                + "\n\t{}".format("\n\t".join(list(ticker_set)))
+                + colorama.Fore.WHITE
+            )
+    this_note = (  # if we got this far, we want to write notes to file
+        str(datetime.today())[:19] + "--misc::" + note_str
+        if topics is None
+        else str(datetime.today())[:19] + "--" + ", ".join(topics) + "::" + note_str
+    )
+    commit_notes(store, [this_note], d)
+    process_line(this_note, d)
+
+
+def forward_to_daemon(argv: List[str]) -> bool:
+    """
+    `forward_to_daemon` runs the command `argv` in the notes daemon (see
+    `serve`), if one is running, and writes its output here
+
+    Parameters
+    ----------
+    `argv` : List[str]
+            command line arguments, without the program name
+
+    Returns
+    -------
+    bool
+        True once the daemon has answered; False if there is no daemon or the
+        command has to run here (it prompts, opens a window or is profiled)
+
+    Example
+    -------
+        `forward_to_daemon` usage:
+    ```python
+        >>> if not forward_to_daemon(sys.argv[1:]): d, args = process_init()
+    ```
+    """
+    if SERVING or not path.exists(DAEMON_SOCKET):
+        return False
+    if environ.get("NOTES_PROFILE") or profile_flag(argv):
+        return False
+    import socket
+
+    request = {"argv": argv, "cwd": getcwd(), "tty": sys.stdout.isatty()}
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(DAEMON_SOCKET)
+    except OSError:  ##stale socket file; daemon not running
+        client.close()
+        return False
+    status = None
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        kind, payload = read_frame(stream)
+        if kind == b"f":  ##daemon hands the command back
+            return False
+        load_colorama()
+        while kind is not None:
+            if kind == b"o":
+                sys.stdout.write(payload.decode("utf-8"))
+            elif kind == b"e":
+                sys.stderr.write(payload.decode("utf-8"))
+            elif kind == b"x":
+                status = int(payload)
+            kind, payload = read_frame(stream)
+    sys.stdout.flush()
+    if status is None:  ##may have half-run; retrying here could add a note twice
+        sys.exit("notes daemon closed the connection before finishing")
+    if status:
+        sys.exit(status)
+    return True
+
+
+def serve(socket_path: str, warm: List[str] = ()):
+    """
+    `serve` runs the notes daemon: answers the commands `forward_to_daemon`
+    sends over Unix socket `socket_path`, one at a time, until interrupted
+
+    Settings, the argument parser, styles and the sidecar indexes stay in
+    memory between commands. Each is checked against its file's size and
+    mtime when used, so changes made without the daemon (another machine
+    syncing the notes file, an edited styles.ini) are picked up by the next
+    command, and notes added through the daemon extend the indexes in place.
+
+    Parameters
+    ----------
+    `socket_path` : str
+            where to listen; removed again on exit
+    `warm` : List[str], optional
+            notes files whose indexes are loaded up front, by default `()`
+    """
+    global SERVING
+    import signal
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("--daemon needs Unix domain sockets, not available on this system")
+        return
+    if path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            print(f"A notes daemon is already listening on {socket_path}")
+            return
+        except OSError:  ##left behind by a daemon that did not exit cleanly
+            remove(socket_path)
+        finally:
+            probe.close()
+
+    load_colorama()  ##wrap our own stdout now; client output is sent raw
+    for p in warm:
+        if path.isfile(p):
+            for kind in SIDECAR_INDEXES:
+                load_index(p, kind)
+    STYLES.load()  # before the first client, not while it waits
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Notes daemon listening on {socket_path}; Ctrl-C to stop")
+    SERVING = True
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection, connection.makefile("rwb") as stream:
+                try:
+                    handle_request(stream)
+                except (OSError, ValueError):  ##client went away or sent junk
+                    pass
+    except KeyboardInterrupt:
+        print("Notes daemon stopped")
+    finally:
+        SERVING = False
+        server.close()
+        remove(socket_path)
+
+
+def handle_request(stream):
+    """
+    `handle_request` runs one command read from a daemon client's `stream`
+    through `main`, sending its stdout, stderr and exit status back as frames
+    (see `write_frame`), or a fallback frame for commands the client must run
+    """
+    request = json.loads(stream.readline())
+    saved = sys.argv, sys.stdout, sys.stderr, getcwd()
+    sys.argv = ["notes.py", *request["argv"]]
+    sys.stdout = FrameWriter(stream, b"o", request["tty"])
+    sys.stderr = FrameWriter(stream, b"e")
+    status = 0
+    try:
+        chdir(request["cwd"])
+        d, args = process_init()
+        if runs_in_client(args, d, request["tty"]):
+            status = None
+        else:
+            main()
+    except SystemExit as exc:  ##argparse errors and --help
+        status = exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+    except Exception as exc:  ##report it to the client and keep serving
+        print(f"notes daemon: {exc!r}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.argv, sys.stdout, sys.stderr, cwd = saved
+        chdir(cwd)
+        flush_styles()
+        flush_render_cache()
+    if status is None:
+        write_frame(stream, b"f")
+    else:
+        write_frame(stream, b"x", str(status).encode("ascii"))
+    stream.flush()
+
+
+def runs_in_client(args: "argparse.Namespace", d: Dict, tty: bool) -> bool:
+    """
+    `runs_in_client` commands the daemon hands back: the loop and the pager
+    prompt, open launches an editor, importing from stdin reads the client's
+    stdin, a daemon does not start daemons, and --notebooks queries fork
+    their own worker processes
+    """
+    if getattr(args, "daemon") is True or getattr(args, "import") == "-":
+        return True
+    if get_attr_by_flag(args, d, "default_loop_flags") is True:
+        return True
+    if get_attr_by_flag(args, d, "default_open_flags") is True:
+        return True
+    if getattr(args, "notebooks") is not None:  ##its process pool, not the daemon's
+        return True
+    listing = (
+        get_attr_by_flag(args, d, "default_topic_flags") is None
+        and get_attr_by_flag(args, d, "default_note_flags") is None
+        and getattr(args, "search") is None
+    )
+    return tty and listing
+
+
+class FrameWriter:
+    """
+    `FrameWriter` text stream that sends everything written to it to a daemon
+    client as `kind` frames; stands in for sys.stdout / sys.stderr in `serve`
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, stream, kind: bytes, tty: bool = False):
+        self.stream = stream
+        self.kind = kind
+        self.tty = tty
+
+    def write(self, s: str) -> int:
+        if s:
+            write_frame(self.stream, self.kind, s.encode("utf-8"))
+        return len(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self) -> bool:
+        return self.tty
+
+
+def write_frame(stream, kind: bytes, payload: bytes = b""):
+    """
+    `write_frame` one message of the daemon protocol: a kind byte (`o`
+    stdout, `e` stderr, `x` exit status, `f` run it yourself), the payload
+    length as 4 bytes big-endian, then the payload
+    """
+    stream.write(kind + len(payload).to_bytes(4, "big") + payload)
+
+
+def read_frame(stream) -> Tuple[Optional[bytes], bytes]:
+    """`read_frame` next (kind, payload) from `stream`; kind is None at the end"""
+    header = stream.read(5)
+    if len(header) < 5:
+        return None, b""
+    return header[:1], stream.read(int.from_bytes(header[1:], "big"))
+
+
+def get_lines_from_path(path):
+    with open(path, "r") as f:
+        lines = f.readlines()
+    return lines
+
+
+class Note:
+    """
+    `Note` one parsed line of a notes file
+
+    Lines look like `YYYY-MM-DD HH:MM:SS--topic, topic::body;body`; see
+    `parse_note`.
+
+    Parameters
+    ----------
+    `timestamp` : str
+            "YYYY-MM-DD HH:MM:SS" (sorts chronologically as a string)
+    `topics` : Tuple[str, ...]
+            upper-case topics (see `split_topics`)
+    `body` : Tuple[str, ...]
+            body split on the line break character, segments stripped
+    `offset` : int, optional
+            byte offset of the line in its file, by default `None`
+    """
+
+    __slots__ = ("timestamp", "topics", "body", "offset")
+
+    def __init__(
+        self,
+        timestamp: str,
+        topics: Tuple[str, ...],
+        body: Tuple[str, ...],
+        offset: int = None,
+    ):
+        self.timestamp = timestamp
+        self.topics = topics
+        self.body = body
+        self.offset = offset
+
+    def __reduce__(self):  ##compact pickles for `query_notebooks` workers
+        return Note, (self.timestamp, self.topics, self.body, self.offset)
+
+    def __repr__(self):
+        return (
+            f"Note({self.timestamp!r}, {self.topics!r}, {self.body!r}, {self.offset!r})"
+        )
+
+
+def parse_note(line: str, offset: int = None, linebreak: str = ";") -> Optional[Note]:
+    """
+    `parse_note` parses one line of a notes file
+
+    This is the only place the line format is parsed; everything else works
+    on `Note` records.
+
+    Parameters
+    ----------
+    `line` : str
+            note
+    `offset` : int, optional
+            byte offset of `line` in its file, by default `None`
+    `linebreak` : str, optional
+            separates thoughts in the body ("\\;" escapes it), by default `";"`
+
+    Returns
+    -------
+    Optional[Note]
+        None if `line` is not a note (malformed or blank)
+
+    Example
+    -------
+        `parse_note` usage:
+    ```python
+        >>> parse_note("2021-03-01 09:30:00--python, ops::deploy; check logs")
+        Note("2021-03-01 09:30:00", ("PYTHON", "OPS"), ("deploy", "check logs"), None)
+    ```
+    """
+    mat = NOTE_MATCH(line)
+    if mat is None:
+        return None
+    timestamp, topics, body = mat.groups()
+    body = body.replace(r"\;", "\0").split(linebreak)
+    return Note(
+        timestamp,
+        tuple(split_topics(topics)),
+        tuple(segment.replace("\0", ";").strip() for segment in body),
+        offset,
+    )
+
+
+def parse_notes(
+    records: Iterable[Tuple[int, str]], linebreak: str = ";"
+) -> Iterator[Note]:
+    """
+    `parse_notes` parses (offset, line) records, skipping malformed lines
+
+    Parameters
+    ----------
+    `records` : Iterable[Tuple[int, str]]
+            e.g. `iter_records(...)`
+    `linebreak` : str, optional
+            see `parse_note`, by default `";"`
+
+    Yields
+    ------
+    Note
+        parsed notes, in the order of `records`
+    """
+    for offset, line in records:
+        note = parse_note(line, offset, linebreak)
+        if note is not None:
+            yield note
+
+
+def append_note(p: str, note: str):
+    """
+    `append_note` appends `note` to the end of journal `p`
+
+    The notes file is an append-only journal (oldest first), so adding a note
+    costs the size of the note rather than the size of the file.
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `note` : str
+            formatted note, without trailing newline
+
+    Example
+    -------
+        `append_note` usage:
+    ```python
+        >>> append_note("mynotes.txt", "2021-03-01 09:30:00--misc::buy milk")
+    ```
+    """
+    append_notes(p, [note])
+
+
+def append_notes(p: str, notes: Iterable[str]):
+    """
+    `append_notes` appends `notes` to the end of journal `p` in one write,
+    keeping the sidecar indexes current
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `notes` : Iterable[str]
+            formatted notes, oldest first, without trailing newlines
+
+    Example
+    -------
+        `append_notes` usage:
+    ```python
+        >>> append_notes("mynotes.txt", ["2021-03-01 09:30:00--misc::buy milk"])
+    ```
+    """
+    with PROFILER.span("write"):
+        current_indexes = [
+            kind for kind in SIDECAR_INDEXES if index_is_current(p, kind)
+        ]
+        before = get_stamp(p) if path.isfile(p) else None
+        offset = before["size"] if before else 0
+        chunks, parsed = [], []
+        if offset and not ends_with_newline(p):  ##hand-edited: end its last line
+            chunks.append(linesep.encode(ENCODING))
+            offset += len(chunks[0])
+        for note in notes:  # bytes as text mode would write them, for the offsets
+            chunk = (note + linesep).encode(ENCODING, errors="replace")
+            record = parse_note(note, offset) if current_indexes else None
+            if record is not None:
+                parsed.append(record)
+            chunks.append(chunk)
+            offset += len(chunk)
+        with open(p, "ab") as f:
+            f.write(b"".join(chunks))
+        for kind in current_indexes:  # stale indexes are rebuilt when next queried
+            append_to_index(p, kind, parsed)
+
+
+def ends_with_newline(p: str) -> bool:
+    """`ends_with_newline` whether non-empty file `p` ends with a line break"""
+    with open(p, "rb") as f:
+        f.seek(-1, SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def iter_records(
+    p: str, reverse: bool = False, start: int = 0, end: int = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    `iter_records` lazily yields the notes of `p` with their byte offsets
+
+    The file is memory-mapped, so only the pages holding the notes actually
+    consumed are read and resident memory does not grow with the file size.
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `reverse` : bool, optional
+            newest (last) note first, by default `False`
+    `start` : int, optional
+            byte offset of the first note to consider, by default `0`
+    `end` : int, optional
+            byte offset after the last note to consider, by default end of file
+
+    Yields
+    ------
+    Tuple[int, str]
+        (byte offset, note without line ending); blank lines are skipped
+
+    Example
+    -------
+        `iter_records` usage:
+    ```python
+        >>> next(iter_records("mynotes.txt", reverse=True))
+        (4096, "2021-03-01 09:30:00--misc::buy milk")
+    ```
+    """
+    with open(p, "rb") as f:
+        try:
+            mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:  # empty file
+            return
+    with mm:
+        end = len(mm) if end is None else min(end, len(mm))
+        if reverse:
+            line_end = end
+            while line_end > start:
+                line_start = mm.rfind(b"\n", start, line_end - 1) + 1 or start
+                line = mm[line_start:line_end].rstrip(b"\r\n")
+                if line:
+                    yield line_start, line.decode(ENCODING, errors="replace")
+                line_end = line_start
+        else:
+            line_start = start
+            while line_start < end:
+                line_end = mm.find(b"\n", line_start, end) + 1 or end
+                line = mm[line_start:line_end].rstrip(b"\r\n")
+                if line:
+                    yield line_start, line.decode(ENCODING, errors="replace")
+                line_start = line_end
+
+
+def iter_lines_reverse(p: str) -> Iterator[str]:
+    """
+    `iter_lines_reverse` yields lines of journal `p` newest first
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+
+    Yields
+    ------
+    str
+        non-empty lines, last line of the file first
+
+    Example
+    -------
+        `iter_lines_reverse` usage:
+    ```python
+        >>> next(iter_lines_reverse("mynotes.txt"))
+        "2021-03-01 09:30:00--misc::buy milk\n"
+    ```
+    """
+    for _, line in iter_records(p, reverse=True):
+        yield line + "\n"
+
+
+def find_time_offset(mm: mmap, stamp: str, start: int = 0, end: int = None) -> int:
+    """
+    `find_time_offset` binary search of the journal mapped in `mm` for the
+    first note at or after `stamp`
+
+    Probes land mid-line, so each one moves to the next line start and reads
+    the timestamp of the first note from there; lines without one are skipped.
+
+    Parameters
+    ----------
+    `mm` : mmap
+            the notes file, oldest note first
+    `stamp` : str
+            "YYYY-MM-DD HH:MM:SS"
+    `start` : int, optional
+            byte offset of a line start to search from, by default `0`
+    `end` : int, optional
+            byte offset to search to, by default end of file
+
+    Returns
+    -------
+    int
+        byte offset of that note, or `end` if every note is older
+
+    Example
+    -------
+        `find_time_offset` usage:
+    ```python
+        >>> find_time_offset(mm, "2021-03-01 00:00:00")
+        4096
+    ```
+    """
+    key = stamp.encode(ENCODING)
+    lo, hi = start, len(mm) if end is None else end
+    while lo < hi:
+        mid = (lo + hi) // 2
+        probe = mm.find(b"\n", mid - 1, hi) + 1 if mid > lo else lo
+        if not lo < probe < hi:  # the line at `lo` runs past `mid`
+            probe = lo
+        line_start = probe
+        while line_start < hi:
+            line_end = mm.find(b"\n", line_start, hi) + 1 or hi
+            if TIMESTAMP_PREFIX(mm, line_start, line_end):
+                break
+            line_start = line_end
+        if line_start >= hi:  # no notes from `probe` on
+            hi = probe
+        elif mm[line_start : line_start + len(key)] >= key:
+            hi = line_start
+        else:
+            lo = line_end
+    return lo
+
+
+def time_range(p: str, since: str = None, until: str = None) -> Tuple[int, int]:
+    """
+    `time_range` byte offsets of the notes of `p` with `since` <= timestamp <
+    `until`, by two `find_time_offset` searches
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path, in journal (oldest first) order
+    `since` : str, optional
+            "YYYY-MM-DD HH:MM:SS", by default from the first note
+    `until` : str, optional
+            "YYYY-MM-DD HH:MM:SS", by default to the last note
+
+    Returns
+    -------
+    Tuple[int, int]
+        (start, end) for `iter_records`; equal when no note is in range
+
+    Example
+    -------
+        `time_range` usage:
+    ```python
+        >>> time_range("mynotes.txt", since="2021-03-01 00:00:00")
+        (4096, 8192)
+    ```
+    """
+    with open(p, "rb") as f:
+        try:
+            mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:  # empty file
+            return 0, 0
+    with mm:
+        start = 0 if since is None else find_time_offset(mm, since)
+        end = len(mm) if until is None else find_time_offset(mm, until, start)
+    return start, end
+
+
+def parse_when(value: str, end: bool = False, now: datetime = None) -> str:
+    """
+    `parse_when` a `--since`/`--until` value as a note timestamp
+
+    Either a date or time (2021-03-01, 2021-03-01 09:30), an age counted back
+    from `now` in hours, days or weeks (12h, 7d, 2w), or today/yesterday. A
+    bare date or day stands for its start, or with `end` for the start of the
+    next day, so `--until 2021-03-01` still includes notes of that day.
+
+    Parameters
+    ----------
+    `value` : str
+            what the user typed
+    `end` : bool, optional
+            `value` closes the range (`--until`), by default `False`
+    `now` : datetime, optional
+            reference for ages, by default the current time
+
+    Returns
+    -------
+    str
+        "YYYY-MM-DD HH:MM:SS"
+
+    Raises
+    ------
+    ValueError
+        `value` is none of the above
+
+    Example
+    -------
+        `parse_when` usage:
+    ```python
+        >>> parse_when("7d", now=datetime(2021, 3, 8, 9, 30))
+        "2021-03-01 09:30:00"
+        >>> parse_when("2021-03-01", end=True)
+        "2021-03-02 00:00:00"
+    ```
+    """
+    from datetime import timedelta
+
+    now = now or datetime.now()
+    given, value = value, value.strip().lower()
+    if value in ("today", "yesterday"):
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        day -= timedelta(days=value == "yesterday")
+    elif match(r"\d+[hdw]$", value):
+        unit = {"h": "hours", "d": "days", "w": "weeks"}[value[-1]]
+        return (now - timedelta(**{unit: int(value[:-1])})).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+    else:
+        try:
+            day = datetime.fromisoformat(value.replace("/", "-"))
+        except ValueError:
+            raise ValueError(f"Not a date, time or age: {given}") from None
+        if len(value) > 10:
+            return day.strftime("%Y-%m-%d %H:%M:%S")
+    return (day + timedelta(days=end)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def within(
+    notes: Iterable[Note], since: str = None, until: str = None
+) -> Iterator[Note]:
+    """
+    `within` the notes of a newest-first stream with `since` <= timestamp <
+    `until`; stops reading `notes` at the first one before `since`
+    """
+    for note in notes:
+        if since is not None and note.timestamp < since:
+            break
+        if until is None or note.timestamp < until:
+            yield note
+
+
+def get_notes(p: str, linebreak: str = ";") -> Iterator[Note]:
+    """
+    `get_notes` yields notes from journal `p` newest first (nothing if no file)
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `linebreak` : str, optional
+            see `parse_note`, by default `";"`
+
+    Yields
+    ------
+    Note
+        notes, most recent first
+
+    Example
+    -------
+        `get_notes` usage:
+    ```python
+        >>> [note.timestamp for note in get_notes("mynotes.txt")]
+        ["2021-03-01 09:30:00", ..., "2020-01-01 08:00:00"]
+    ```
+    """
+    if path.isfile(p):
+        ensure_journal(p)
+        yield from parse_notes(iter_records(p, reverse=True), linebreak)
+
+
+def ensure_journal(p: str) -> bool:
+    """
+    `ensure_journal` one-time migration of a newest-first notes file to the
+    append-only (oldest first) journal layout
+
+    Older versions prepended every note, rewriting the whole file. A file is
+    considered to be in that layout when its first note is newer than its last.
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+
+    Returns
+    -------
+    bool
+        True if the file was migrated
+
+    Example
+    -------
+        `ensure_journal` usage:
+    ```python
+        >>> ensure_journal("mynotes.txt")
+        False
+    ```
+    """
+    if not path.isfile(p):
+        return False
+    with PROFILER.span("journal.check"):
+        if not is_newest_first(p):
+            return False
+    with notes_lock(p):
+        if not is_newest_first(p):  # migrated by another process meanwhile
+            return False
+        lines = [
+            line if line.endswith("\n") else line + "\n"
+            for line in get_lines_from_path(p)
+        ]
+        temp_path = f"{p}.migrating"
+        with open(temp_path, "w") as f:
+            f.writelines(reversed(lines))
+        replace(temp_path, p)
+    print(f"Migrated {p} to append-only journal (oldest first)")
+    return True
+
+
+def is_newest_first(p: str) -> bool:
+    """`is_newest_first` whether the first line of `p` is a note newer than
+    its last line, i.e. `p` still has the layout `ensure_journal` migrates"""
+    with open(p, "r") as f:
+        first = match(TIMESTAMP_REGEX, f.readline())
+    last = match(TIMESTAMP_REGEX, next(iter_lines_reverse(p), ""))
+    return first is not None and last is not None and first.group(0) > last.group(0)
+
+
+def split_topics(topics: str) -> List[str]:
+    """
+    `split_topics` normalizes a topics string into upper-case topic names
+
+    Parameters
+    ----------
+    `topics` : str
+            comma-separated (or, without commas, space-separated) topics
+
+    Returns
+    -------
+    List[str]
+        stripped, upper-case topics; empty names dropped
+
+    Example
+    -------
+        `split_topics` usage:
+    ```python
+        >>> split_topics("python, Ops")
+        ["PYTHON", "OPS"]
+    ```
+    """
+    split_char = "," if "," in topics else None
+    return [t.strip().upper() for t in topics.split(split_char) if t.strip()]
+
+
+def topic_keys(note: Note) -> List[str]:
+    """`topic_keys` topics of `note`, as stored in the topic index"""
+    return list(note.topics)
+
+
+def search_keys(note: Note) -> List[str]:
+    """
+    `search_keys` distinct words of the body of `note`, as stored in the
+    full-text index
+
+    Parameters
+    ----------
+    `note` : Note
+            parsed note
+
+    Returns
+    -------
+    List[str]
+        lower-case words, in order of first appearance
+
+    Example
+    -------
+        `search_keys` usage:
+    ```python
+        >>> search_keys(parse_note("2021-03-01 09:30:00--ops::Deploy the API; deploy docs"))
+        ["deploy", "the", "api", "docs"]
+    ```
+    """
+    return list(dict.fromkeys(note_words(note)))
+
+
+def note_words(note: Note) -> List[str]:
+    """`note_words` lower-case words of the body of `note`, in order"""
+    return findall(WORD_REGEX, " ".join(note.body).lower())
+
+
+SIDECAR_INDEXES = {  # index kind -> keys of a note
+    "topics": topic_keys,
+    "search": search_keys,
+}
+
+
+def index_path(p: str, kind: str) -> str:
+    """`index_path` sidecar SQLite file holding the `kind` index of notes file `p`"""
+    return f"{p}.{kind}.sqlite3"
+
+
+def get_stamp(p: str) -> Dict[str, int]:
+    """`get_stamp` size and mtime identifying the current contents of `p`"""
+    st = stat(p)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class Postings:
+    """
+    `Postings` an inverted sidecar index of a notes file, on disk: key -> byte
+    offsets (oldest first) of the notes with that key
+
+    Each row holds one key and a packed array of offsets. A rebuild writes
+    one row per key; each append adds a row per key of the appended notes.
+    A lookup reads only the rows of the keys asked for, through an index on
+    `key`. The size and mtime of the notes file the postings were written
+    for are kept in the same database, so they change together with them.
+
+    Parameters
+    ----------
+    `index_file` : str
+            SQLite file, see `index_path`
+
+    Example
+    -------
+        `Postings` usage:
+    ```python
+        >>> index = load_index("mynotes.txt", "topics")
+        >>> index.get("PYTHON")
+        [0, 118, 4096]
+    ```
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS postings (
+            key TEXT NOT NULL,
+            offsets BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS postings_key ON postings (key);
+        CREATE TABLE IF NOT EXISTS stamp (
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, index_file: str):
+        import sqlite3
+
+        self.index_file = index_file
+        self.connection = sqlite3.connect(
+            index_file, timeout=30, check_same_thread=False
+        )  ##queries may run in the `Pager` worker
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+    def stamp(self) -> Optional[Dict[str, int]]:
+        """stamp of the notes file the postings were written for"""
+        row = self.connection.execute("SELECT size, mtime_ns FROM stamp").fetchone()
+        return None if row is None else {"size": row[0], "mtime_ns": row[1]}
+
+    def add(self, postings: Dict[str, List[int]], stamp: Dict[str, int]):
+        """add `postings` (key -> new offsets, oldest first) and re-stamp, in
+        one transaction"""
+        from array import array
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO postings VALUES (?, ?)",
+                (
+                    (key, array("q", offsets).tobytes())
+                    for key, offsets in postings.items()
+                ),
+            )
+            self.connection.execute("DELETE FROM stamp")
+            self.connection.execute(
+                "INSERT INTO stamp VALUES (?, ?)", (stamp["size"], stamp["mtime_ns"])
+            )
+
+    def get(self, key: str, default: List[int] = None) -> List[int]:
+        """offsets of the notes with `key`, oldest first; `default` if none"""
+        from array import array
+
+        offsets = array("q")
+        for (packed,) in self.connection.execute(
+            "SELECT offsets FROM postings WHERE key = ? ORDER BY rowid", (key,)
+        ):
+            offsets.frombytes(packed)
+        return offsets.tolist() if offsets else default
+
+    def items(self) -> Iterator[Tuple[str, List[int]]]:
+        """every key with its offsets, oldest first"""
+        from array import array
+
+        key, offsets = None, array("q")
+        for row_key, packed in self.connection.execute(
+            "SELECT key, offsets FROM postings ORDER BY key, rowid"
+        ):
+            if row_key != key:
+                if key is not None:
+                    yield key, offsets.tolist()
+                key, offsets = row_key, array("q")
+            offsets.frombytes(packed)
+        if key is not None:
+            yield key, offsets.tolist()
+
+    def values(self) -> Iterator[List[int]]:
+        """offsets of every key"""
+        return (offsets for _, offsets in self.items())
+
+    def close(self):
+        self.connection.close()
+
+
+def collect_postings(kind: str, notes: Iterable[Note]) -> Dict[str, List[int]]:
+    """`collect_postings` key -> offsets of `notes`, for the `kind` index"""
+    keys_of = SIDECAR_INDEXES[kind]
+    postings = {}
+    for note in notes:
+        for key in keys_of(note):
+            postings.setdefault(key, []).append(note.offset)
+    return postings
+
+
+def index_is_current(p: str, kind: str) -> bool:
+    """
+    `index_is_current` checks the `kind` index was written for `p` as it is now
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `kind` : str
+            key of `SIDECAR_INDEXES`
+
+    Returns
+    -------
+    bool
+        False if the index is missing, unreadable or `p` changed size or
+        mtime since
+    """
+    import sqlite3
+
+    if not path.isfile(index_path(p, kind)):
+        return False
+    try:
+        index = Postings(index_path(p, kind))
+        try:
+            return index.stamp() == get_stamp(p)
+        finally:
+            index.close()
+    except sqlite3.DatabaseError:  ##not a database: rebuilt
+        return False
+
+
+def append_to_index(p: str, kind: str, notes: Iterable[Note]):
+    """
+    `append_to_index` adds notes to the `kind` index of `p` and re-stamps it
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `kind` : str
+            key of `SIDECAR_INDEXES`
+    `notes` : Iterable[Note]
+            notes appended to `p`, with their offsets
+    """
+    index = Postings(index_path(p, kind))
+    try:
+        index.add(collect_postings(kind, notes), get_stamp(p))
+    finally:
+        index.close()
+
+
+def rebuild_index(p: str, kind: str):
+    """
+    `rebuild_index` writes the `kind` index of `p` from scratch
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `kind` : str
+            key of `SIDECAR_INDEXES`
+    """
+    temp_path = f"{index_path(p, kind)}.{getpid()}.tmp"
+    if path.isfile(temp_path):  # left by a rebuild that was killed
+        remove(temp_path)
+    stamp = get_stamp(p)
+    index = Postings(temp_path)
+    try:
+        index.add(collect_postings(kind, parse_notes(iter_records(p))), stamp)
+    finally:
+        index.close()
+    replace(temp_path, index_path(p, kind))
+    for old in (f"{p}.{kind}", f"{p}.{kind}.stamp"):  ##line-per-note layout
+        if path.isfile(old):
+            remove(old)
+
+
+def load_index(p: str, kind: str) -> Postings:
+    """
+    `load_index` the `kind` index of `p`, rebuilding it first if it is out
+    of date
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `kind` : str
+            key of `SIDECAR_INDEXES`
+
+    Returns
+    -------
+    Postings
+        inverted index; lookups read only the postings of the keys asked for
+
+    Example
+    -------
+        `load_index` usage:
+    ```python
+        >>> load_index("mynotes.txt", "topics").get("PYTHON", [])
+        [0, 118, 4096]
+    ```
+    """
+    ensure_journal(p)
+    if not index_is_current(p, kind):
+        with notes_lock(p):
+            if not index_is_current(p, kind):  # unless another process just did
+                with PROFILER.span(f"index.rebuild.{kind}"):
+                    rebuild_index(p, kind)
+    return Postings(index_path(p, kind))
+
+
+def read_notes_at(
+    p: str, offsets: Iterable[int], linebreak: str = ";"
+) -> Iterator[Note]:
+    """
+    `read_notes_at` yields the notes of `p` starting at each of `offsets`
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `offsets` : Iterable[int]
+            byte offsets of notes
+    `linebreak` : str, optional
+            see `parse_note`, by default `";"`
+
+    Yields
+    ------
+    Note
+        notes, in the order of `offsets`
+    """
+    with open(p, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            line = f.readline().rstrip(b"\r\n").decode(ENCODING, errors="replace")
+            note = parse_note(line, offset, linebreak)
+            if note is not None:
+                yield note
+
+
+def get_notes_by_topics(
+    p: str, topics: List[str], linebreak: str = ";"
+) -> Iterator[Note]:
+    """
+    `get_notes_by_topics` yields notes of `p` tagged with any of `topics`,
+    newest first, using the topic index
+
+    Topics match whole names, case-insensitively (PY does not match PYTHON).
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `topics` : List[str]
+            topics to look for
+    `linebreak` : str, optional
+            see `parse_note`, by default `";"`
+
+    Yields
+    ------
+    Note
+        matching notes
+
+    Example
+    -------
+        `get_notes_by_topics` usage:
+    ```python
+        >>> [note.body for note in get_notes_by_topics("mynotes.txt", ["python"])]
+        [("deploy",)]
+    ```
+    """
+    if not path.isfile(p):
+        return
+    index = load_index(p, "topics")
+    offsets = set()
+    for topic in topics:
+        offsets.update(index.get(topic.strip().upper(), []))
+    yield from read_notes_at(p, sorted(offsets, reverse=True), linebreak)
+
+
+def parse_search_query(query: str) -> List[List[str]]:
+    """
+    `parse_search_query` splits `query` into phrases of lower-case words
+
+    Quoted text is one phrase; every other word is a phrase of its own.
+
+    Parameters
+    ----------
+    `query` : str
+            search query
+
+    Returns
+    -------
+    List[List[str]]
+        phrases, each a list of words
+
+    Example
+    -------
+        `parse_search_query` usage:
+    ```python
+        >>> parse_search_query('deploy "release notes"')
+        [["deploy"], ["release", "notes"]]
+    ```
+    """
+    phrases = []
+    for quoted, bare in findall(r'"([^"]*)"|(\S+)', query.lower()):
+        words = findall(WORD_REGEX, quoted or bare)
+        if words:
+            phrases.append(words)
+    return phrases
+
+
+def contains_phrase(words: List[str], phrase: List[str]) -> bool:
+    """`contains_phrase` checks `phrase` appears as consecutive `words`"""
+    size = len(phrase)
+    return any(
+        words[i : i + size] == phrase
+        for i, word in enumerate(words)
+        if word == phrase[0]
+    )
+
+
+def search_notes(
+    p: str, query: str, topics: List[str] = None, linebreak: str = ";"
+) -> Iterator[Note]:
+    """
+    `search_notes` yields notes of `p` whose body matches every word and
+    phrase of `query`, newest first, using the full-text index
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+    `query` : str
+            words and quoted phrases (see `parse_search_query`)
+    `topics` : List[str], optional
+            only search notes tagged with any of these, by default `None`
+    `linebreak` : str, optional
+            see `parse_note`, by default `";"`
+
+    Yields
+    ------
+    Note
+        matching notes
+
+    Example
+    -------
+        `search_notes` usage:
+    ```python
+        >>> [note.body for note in search_notes("mynotes.txt", 'deploy "the api"')]
+        [("Deploy the API", "deploy docs")]
+    ```
+    """
+    phrases = parse_search_query(query)
+    if not phrases or not path.isfile(p):
+        return
+    index = load_index(p, "search")
+    postings = []
+    for word in {word for phrase in phrases for word in phrase}:
+        found = index.get(word)
+        if found is None:  ##a word no note has: only its lookup was read
+            return
+        postings.append(found)
+    postings.sort(key=len)  # intersect from the rarest word
+    offsets = set(postings[0])
+    for found in postings[1:]:
+        offsets.intersection_update(found)
+        if not offsets:
+            return
+    if topics:
+        topic_index = load_index(p, "topics")
+        offsets &= {
+            offset
+            for topic in topics
+            for offset in topic_index.get(topic.strip().upper(), [])
+        }
+    multi_word = [phrase for phrase in phrases if len(phrase) > 1]
+    for note in read_notes_at(p, sorted(offsets, reverse=True), linebreak):
+        if multi_word:
+            words = note_words(note)
+            if not all(contains_phrase(words, phrase) for phrase in multi_word):
+                continue
+        yield note
+
+
+class NoteStore(ABC):
+    """
+    `NoteStore` where the notes of a notebook live; see `open_store`
+
+    Backends implement the abstract methods below and may override the
+    others. Queries yield `Note` records newest first, with `offset` a
+    backend-specific position of the note.
+
+    Parameters
+    ----------
+    `p` : str
+            notes file path
+
+    Example
+    -------
+        `NoteStore` usage:
+    ```python
+        >>> store = open_store("mynotes.db")
+        >>> store.append("2021-03-01 09:30:00--misc::buy milk")
+        >>> [note.body for note in store.by_topics(["misc"])]
+        [("buy milk",)]
+    ```
+    """
+
+    def __init__(self, p: str):
+        self.path = p
+
+    def exists(self) -> bool:
+        """False until the first note is added"""
+        return path.isfile(self.path)
+
+    def append(self, note: str):
+        """add one formatted note (`timestamp--topics::body`)"""
+        self.append_many([note])
+
+    @abstractmethod
+    def append_many(self, notes: Iterable[str]):
+        """add formatted notes, oldest first, in one write"""
+
+    @abstractmethod
+    def notes(self, linebreak: str = ";") -> Iterator[Note]:
+        """every note"""
+
+    @abstractmethod
+    def by_topics(self, topics: List[str], linebreak: str = ";") -> Iterator[Note]:
+        """notes tagged with any of `topics` (whole names, any case)"""
+
+    @abstractmethod
+    def between(
+        self,
+        since: str = None,
+        until: str = None,
+        topics: List[str] = None,
+        linebreak: str = ";",
+    ) -> Iterator[Note]:
+        """notes with `since` <= timestamp < `until` ("YYYY-MM-DD HH:MM:SS"),
+        only those tagged with any of `topics` if given"""
+
+    @abstractmethod
+    def search(
+        self, query: str, topics: List[str] = None, linebreak: str = ";"
+    ) -> Iterator[Note]:
+        """notes matching `query` (see `search_notes`)"""
+
+    @abstractmethod
+    def lines(self, archived: bool = True) -> Iterator[str]:
+        """every note as a formatted line, oldest first; for `export_notes`.
+        Without `archived`, leaves out notes in archive segments (`archive_notes`)"""
+
+    def tags(self) -> Set[str]:
+        """distinct topics of the notes, as written (i.e.: "PY, OPS")"""
+        return {", ".join(note.topics) for note in self.notes() if note.topics}
+
+    def stats(self) -> Dict:
+        """counts per topic and period, see `collect_stats`"""
+        return collect_stats(self.notes())
+
+    def close(self):
+        """release open files; the store reopens them when used again"""
+
+
+class TextStore(NoteStore):
+    """
+    `TextStore` notes in the plain text journal, one line per note, oldest
+    first, queried through the sidecar indexes, followed (older still) by any
+    compressed archive segments, see `archive_notes`
+    """
+
+    def append_many(self, notes: Iterable[str]):
+        ensure_journal(self.path)
+        append_notes(self.path, notes)
+
+    def notes(self, linebreak: str = ";") -> Iterator[Note]:
+        yield from get_notes(self.path, linebreak)
+        yield from self.archived(linebreak=linebreak)
+
+    def by_topics(self, topics: List[str], linebreak: str = ";") -> Iterator[Note]:
+        yield from get_notes_by_topics(self.path, topics, linebreak)
+        yield from self.archived(topics=topics, linebreak=linebreak)
+
+    def between(
+        self,
+        since: str = None,
+        until: str = None,
+        topics: List[str] = None,
+        linebreak: str = ";",
+    ) -> Iterator[Note]:
+        """the journal is in time order, so the range is found by bisecting
+        it (see `time_range`) and only the notes inside it are read"""
+        if self.exists():
+            ensure_journal(self.path)
+            start, end = time_range(self.path, since, until)
+            if topics is None:
+                records = iter_records(self.path, reverse=True, start=start, end=end)
+                yield from parse_notes(records, linebreak)
+            else:
+                index = load_index(self.path, "topics")
+                offsets = {
+                    offset
+                    for topic in topics
+                    for offset in index.get(topic.strip().upper(), [])
+                    if start <= offset < end
+                }
+                offsets = sorted(offsets, reverse=True)
+                yield from read_notes_at(self.path, offsets, linebreak)
+        yield from self.archived(since, until, topics, linebreak)
+
+    def search(
+        self, query: str, topics: List[str] = None, linebreak: str = ";"
+    ) -> Iterator[Note]:
+        yield from search_notes(self.path, query, topics, linebreak)
+        phrases = parse_search_query(query)
+        if not phrases:
+            return
+        for note in self.archived(topics=topics, linebreak=linebreak):
+            words = note_words(note)
+            if all(contains_phrase(words, phrase) for phrase in phrases):
+                yield note
+
+    def archived(
+        self,
+        since: str = None,
+        until: str = None,
+        topics: List[str] = None,
+        linebreak: str = ";",
+    ) -> Iterator[Note]:
+        """notes of the archive segments, newest first, like `between`;
+        segments whose footer rules the query out are not decompressed"""
+        keys = None if topics is None else {topic.strip().upper() for topic in topics}
+        for seg in reversed(list_segments(self.path)):
+            footer = segment_footer(seg)
+            if (
+                (since is not None and footer["last"] < since)
+                or (until is not None and footer["first"] >= until)
+                or (keys is not None and keys.isdisjoint(footer["topics"]))
+            ):
+                continue
+            for note in within(segment_notes(seg, linebreak), since, until):
+                if keys is None or not keys.isdisjoint(topic_keys(note)):
+                    yield note
+
+    def lines(self, archived: bool = True) -> Iterator[str]:
+        if archived:
+            for seg in list_segments(self.path):
+                yield from read_segment(seg)
+        if self.exists():
+            ensure_journal(self.path)
+            for _, line in iter_records(self.path):
+                yield line
+
+    def tags(self) -> Set[str]:
+        tags = {", ".join(note.topics) for note in get_notes(self.path) if note.topics}
+        for seg in list_segments(self.path):
+            tags.update(segment_footer(seg)["tags"])
+        return tags
+
+    def stats(self) -> Dict:
+        """archive segments from their footers; the journal from the topic
+        index when it is current: topic counts are the lengths of its offset
+        lists and first/last seen the notes at either end (the journal is in
+        time order), so other notes are not parsed"""
+        topics, days = {}, {}
+        for seg in list_segments(self.path):
+            footer = segment_footer(seg)
+            merge_tally(topics, days, footer["topics"], footer["days"])
+        if not self.exists():
+            return summarize_stats(topics, days)
+        if not index_is_current(self.path, "topics"):
+            tally_notes(get_notes(self.path), topics, days)
+            return summarize_stats(topics, days)
+        index = load_index(self.path, "topics")
+        ends = sorted({offsets[i] for offsets in index.values() for i in (0, -1)})
+        seen_at = {
+            note.offset: note.timestamp for note in read_notes_at(self.path, ends)
+        }
+        recent = {
+            topic: [len(offsets), seen_at[offsets[0]], seen_at[offsets[-1]]]
+            for topic, offsets in index.items()
+        }
+        recent_days = {}
+        with PROFILER.span("read"):
+            for _, line in iter_records(self.path):
+                if NOTE_MATCH(line):
+                    recent_days[line[:10]] = recent_days.get(line[:10], 0) + 1
+        merge_tally(topics, days, recent, recent_days)
+        return summarize_stats(topics, days)
+
+
+class SqliteStore(NoteStore):
+    """
+    `SqliteStore` notes in a SQLite database: indexed topic and timestamp
+    columns, an FTS5 table over the bodies and transactional writes
+
+    Each note keeps its formatted line, so it parses and exports exactly like
+    a line of the text journal. Without FTS5 in the sqlite3 build, searches
+    fall back to scanning.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            line TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS notes_timestamp ON notes (timestamp);
+        CREATE TABLE IF NOT EXISTS note_topics (
+            topic TEXT NOT NULL,
+            note_id INTEGER NOT NULL REFERENCES notes (id),
+            PRIMARY KEY (topic, note_id)
+        ) WITHOUT ROWID;
+    """
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts
+        USING fts5 (body, tokenize = "unicode61 tokenchars '_'")
+    """  # tokens match WORD_REGEX
+
+    def __init__(self, p: str):
+        super().__init__(p)
+        self._connection = None
+        self.fts = True
+
+    @property
+    def connection(self):
+        """the database, created with its schema on first use"""
+        if self._connection is None:
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                self._connection.executescript(self.SCHEMA)
+                try:
+                    self._connection.execute(self.FTS_SCHEMA)
+                except sqlite3.OperationalError:  # built without FTS5
+                    self.fts = False
+        return self._connection
+
+    def append_many(self, notes: Iterable[str]):
+        with PROFILER.span("write"), self.connection as db:  # one transaction
+            for line in notes:
+                note = parse_note(line)
+                if note is None:
+                    continue
+                note_id = db.execute(
+                    "INSERT INTO notes (timestamp, line) VALUES (?, ?)",
+                    (note.timestamp, line),
+                ).lastrowid
+                db.executemany(
+                    "INSERT OR IGNORE INTO note_topics (topic, note_id) VALUES (?, ?)",
+                    [(topic, note_id) for topic in note.topics],
+                )
+                if self.fts:
+                    db.execute(
+                        "INSERT INTO notes_fts (rowid, body) VALUES (?, ?)",
+                        (note_id, " ".join(note.body)),
+                    )
+
+    def query(self, sql: str, params=(), linebreak: str = ";") -> Iterator[Note]:
+        """`query` notes of the (id, line) rows selected by `sql`"""
+        for note_id, line in self.connection.execute(sql, params):
+            note = parse_note(line, note_id, linebreak)
+            if note is not None:
+                yield note
+
+    def notes(self, linebreak: str = ";") -> Iterator[Note]:
+        return self.query("SELECT id, line FROM notes ORDER BY id DESC", (), linebreak)
+
+    def by_topics(self, topics: List[str], linebreak: str = ";") -> Iterator[Note]:
+        topics = [topic.strip().upper() for topic in topics]
+        return self.query(
+            "SELECT id, line FROM notes WHERE id IN (SELECT note_id FROM note_topics "
+            f"WHERE topic IN ({', '.join('?' * len(topics))})) ORDER BY id DESC",
+            topics,
+            linebreak,
+        )
+
+    def between(
+        self,
+        since: str = None,
+        until: str = None,
+        topics: List[str] = None,
+        linebreak: str = ";",
+    ) -> Iterator[Note]:
+        sql = "SELECT id, line FROM notes WHERE timestamp >= ? AND timestamp < ?"
+        params = [since or "", until or "9999"]
+        if topics is not None:
+            params += [topic.strip().upper() for topic in topics]
+            sql += (
+                " AND id IN (SELECT note_id FROM note_topics "
+                f"WHERE topic IN ({', '.join('?' * len(topics))}))"
+            )
+        return self.query(sql + " ORDER BY timestamp DESC, id DESC", params, linebreak)
+
+    def search(
+        self, query: str, topics: List[str] = None, linebreak: str = ";"
+    ) -> Iterator[Note]:
+        phrases = parse_search_query(query)
+        if not phrases or not self.exists():
+            return
+        if self.fts:  # candidates from FTS5, then the same checks as the text index
+            sql = (
+                "SELECT id, line FROM notes WHERE id IN "
+                "(SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)"
+            )
+            params = [" AND ".join(f'"{" ".join(phrase)}"' for phrase in phrases)]
+        else:
+            sql, params = "SELECT id, line FROM notes WHERE 1", []
+        if topics:
+            topics = [topic.strip().upper() for topic in topics]
+            sql += (
+                " AND id IN (SELECT note_id FROM note_topics "
+                f"WHERE topic IN ({', '.join('?' * len(topics))}))"
+            )
+            params += topics
+        for note in self.query(sql + " ORDER BY id DESC", params, linebreak):
+            words = note_words(note)
+            if all(contains_phrase(words, phrase) for phrase in phrases):
+                yield note
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def lines(self, archived: bool = True) -> Iterator[str]:
+        if self.exists():  # a database has no archive segments
+            for (line,) in self.connection.execute(
+                "SELECT line FROM notes ORDER BY id"
+            ):
+                yield line
+
+
+STORE_BACKENDS = {  # file extension -> NoteStore; anything else is a text journal
+    ".db": SqliteStore,
+    ".sqlite": SqliteStore,
+    ".sqlite3": SqliteStore,
+}
+
+
+def open_store(p: str) -> NoteStore:
+    """
+    `open_store` the `NoteStore` for notes file `p`, chosen by its extension
+    (see `STORE_BACKENDS`)
+
+    Example
+    -------
+        `open_store` usage:
+    ```python
+        >>> open_store("mynotes.txt")
+        <TextStore>
+        >>> open_store("mynotes.db")
+        <SqliteStore>
+    ```
+    """
+    return STORE_BACKENDS.get(path.splitext(p)[1].lower(), TextStore)(p)
+
+
+def export_notes(source: NoteStore, dest: NoteStore, batch_size: int = 10000) -> int:
+    """
+    `export_notes` copies every note of `source` to the empty store `dest`,
+    oldest first, `batch_size` notes per write (one transaction for SQLite)
+
+    Parameters
+    ----------
+    `source` : NoteStore
+            notes to copy
+    `dest` : NoteStore
+            store to copy them to; must not have notes yet
+    `batch_size` : int, optional
+            notes per write, by default `10000`
+
+    Returns
+    -------
+    int
+        number of notes copied
+
+    Example
+    -------
+        `export_notes` usage:
+    ```python
+        >>> export_notes(open_store("mynotes.txt"), open_store("mynotes.db"))
+        1042
+    ```
+    """
+    if dest.exists() and next(dest.notes(), None) is not None:
+        raise FileExistsError(f"{dest.path} already has notes")
+    return append_in_batches(dest, source.lines(), batch_size)
+
+
+def append_in_batches(
+    store: NoteStore, notes: Iterable[str], batch_size: int = 10000
+) -> int:
+    """`append_in_batches` adds `notes` to `store`, `batch_size` per write;
+    returns how many"""
+    count, batch = 0, []
+    for note in notes:
+        batch.append(note)
+        if len(batch) >= batch_size:
+            store.append_many(batch)
+            count, batch = count + len(batch), []
+    if batch:
+        store.append_many(batch)
+    return count + len(batch)
+
+
+def expand_notebooks(patterns: List[str]) -> List[str]:
+    """
+    `expand_notebooks` the notes files named or matched (glob, i.e.:
+    "projects/*.txt") by `patterns`, each once, in the order given
+
+    Example
+    -------
+        `expand_notebooks` usage:
+    ```python
+        >>> expand_notebooks(["work.txt", "projects/*.db"])
+        ["work.txt", "projects/api.db", "projects/web.db"]
+    ```
+    """
+    from glob import glob
+
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob(pattern)) or [pattern])
+    return [p for p in dict.fromkeys(paths) if path.isfile(p)]
+
+
+def query_notebook(
+    p: str,
+    query: str = None,
+    topics: List[str] = None,
+    since: str = None,
+    until: str = None,
+    linebreak: str = ";",
+) -> List[Note]:
+    """
+    `query_notebook` the notes of notebook `p` matching `query` (see
+    `search_notes`), `topics` and `since` <= timestamp < `until`, newest
+    first; every filter is optional. Runs in the `query_notebooks` workers.
+    """
+    store = open_store(p)
+    try:
+        if not store.exists():
+            return []
+        if query is not None:
+            notes = within(store.search(query, topics, linebreak), since, until)
+        elif since is not None or until is not None:
+            notes = store.between(since, until, topics, linebreak)
+        elif topics is not None:
+            notes = store.by_topics(topics, linebreak)
+        else:
+            notes = store.notes(linebreak)
+        return list(notes)
+    finally:
+        store.close()
+
+
+def query_notebooks(
+    paths: List[str], workers: int = None, **filters: Any
+) -> Iterator[Note]:
+    """
+    `query_notebooks` runs `query_notebook` with `filters` on every notebook
+    of `paths`, on a pool of `workers` processes (by default one per CPU),
+    and merges the results into one stream, newest first
+
+    Each notebook is queried by one worker with its own indexes, so the work
+    spreads over the cores; only the matches come back to be merged.
+
+    Parameters
+    ----------
+    `paths` : List[str]
+            notes files, see `expand_notebooks`
+    `workers` : int, optional
+            processes, by default `None` (CPU count, at most one per notebook)
+    `filters` : Any
+            `query`, `topics`, `since`, `until`, `linebreak` of `query_notebook`
+
+    Yields
+    ------
+    Note
+        matching notes of all notebooks, most recent first
+
+    Example
+    -------
+        `query_notebooks` usage:
+    ```python
+        >>> [n.timestamp for n in query_notebooks(["a.txt", "b.db"], topics=["PY"])]
+        ["2021-03-01 09:30:00", "2021-02-27 18:00:00", ...]
+    ```
+    """
+    from heapq import merge
+
+    from os import cpu_count
+
+    query = partial(query_notebook, **filters)
+    workers = min(workers or cpu_count() or 1, len(paths))
+    if workers < 2:  ##not worth the processes
+        results = list(map(query, paths))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with PROFILER.span("query.pool"), ProcessPoolExecutor(workers) as pool:
+            chunksize = max(1, len(paths) // (workers * 4))
+            results = list(pool.map(query, paths, chunksize=chunksize))
+    yield from merge(*results, key=lambda note: note.timestamp, reverse=True)
+
+
+def backup_dir(p: str) -> str:
+    """`backup_dir` folder holding the backup generations of notes file `p`"""
+    return f"{p}.backups"
+
+
+def load_backup_manifest(p: str) -> Dict:
+    """
+    `load_backup_manifest` the generations (oldest first) backed up for notes
+    file `p`, and the stamp `p` had after the last backed up write
+    """
+    try:
+        with open(path.join(backup_dir(p), "manifest.json"), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"stamp": None, "generations": []}
+
+
+def save_backup_manifest(p: str, manifest: Dict):
+    """`save_backup_manifest` writes `manifest` for `p` (atomically)"""
+    manifest_path = path.join(backup_dir(p), "manifest.json")
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    replace(f"{manifest_path}.tmp", manifest_path)
+
+
+@contextmanager
+def backup_log(store: NoteStore, notes: List[str], d: Dict) -> Iterator[None]:
+    """
+    `backup_log` backs up `notes` before the body of the `with` adds them to
+    `store`
+
+    Backups come in generations: a compressed snapshot of the notebook plus a
+    write-ahead log of the notes added since, so backing up a note costs
+    about the size of the note. A new generation starts every
+    `default_backup_snapshot_every` notes (its snapshot is the previous one
+    with the log appended, not a re-read of the notebook), or with a full
+    snapshot when `store` was changed by something else since the last
+    backup. The newest `default_backup_retention` generations are kept.
+
+    Parameters
+    ----------
+    `store` : NoteStore
+            notebook being written
+    `notes` : List[str]
+            formatted notes about to be added
+    `d` : Dict
+            ini params
+
+    Example
+    -------
+        `backup_log` usage:
+    ```python
+        >>> with backup_log(store, [note], d):
+        ...     store.append(note)
+    ```
+    """
+    retention = max(int(d.get("default_backup_retention", 5)), 1)
+    snapshot_every = max(int(d.get("default_backup_snapshot_every", 1000)), 1)
+    folder = backup_dir(store.path)
+    manifest = load_backup_manifest(store.path)
+    generations = manifest["generations"]
+    with PROFILER.span("backup"):
+        makedirs(folder, exist_ok=True)
+        stamp = get_stamp(store.path) if store.exists() else None
+        if not generations or manifest["stamp"] != stamp:
+            start_backup_generation(store, generations, full=True)
+        elif generations[-1]["records"] >= snapshot_every:
+            start_backup_generation(store, generations, full=False)
+        for generation in generations[:-retention]:
+            for ext in (".gz", ".wal"):
+                try:
+                    remove(path.join(folder, generation["name"] + ext))
+                except FileNotFoundError:
+                    pass
+        del generations[:-retention]
+        with open(
+            path.join(folder, generations[-1]["name"] + ".wal"), "a", encoding="utf-8"
+        ) as f:
+            f.writelines(note + "\n" for note in notes)
+        generations[-1]["records"] += len(notes)
+        save_backup_manifest(store.path, manifest)
+    yield
+    manifest["stamp"] = get_stamp(store.path)
+    save_backup_manifest(store.path, manifest)
+
+
+def start_backup_generation(store: NoteStore, generations: List[Dict], full: bool):
+    """
+    `start_backup_generation` writes the snapshot of a new backup generation
+    of `store` and adds it to `generations`
+
+    A `full` snapshot reads every note of the notes file of `store` (not its
+    archive segments); otherwise the snapshot is the previous snapshot
+    followed by its log, as a second gzip member.
+    """
+    import gzip
+    from shutil import copyfile, copyfileobj
+
+    folder = backup_dir(store.path)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    snapshot_path = path.join(folder, f"{name}.gz")
+    if full:
+        with gzip.open(f"{snapshot_path}.tmp", "wt", 6, encoding="utf-8") as f:
+            for line in store.lines(archived=False):  # segments are not restored
+                f.write(line + "\n")
+    else:
+        previous = path.join(folder, generations[-1]["name"])
+        copyfile(f"{previous}.gz", f"{snapshot_path}.tmp")
+        with open(f"{previous}.wal", "rb") as log, gzip.open(
+            f"{snapshot_path}.tmp", "ab", 6
+        ) as f:
+            copyfileobj(log, f)
+    replace(f"{snapshot_path}.tmp", snapshot_path)
+    generations.append({"name": name, "records": 0})
+
+
+def commit_notes(store: NoteStore, notes: List[str], d: Dict):
+    """
+    `commit_notes` adds `notes` to `store`, backed up first (see
+    `backup_log`), together with the notes of any other processes writing at
+    the same time (group commit)
+
+    Each writer drops its notes in the `store`.spool folder and then waits
+    for the lock on `store`. Whoever gets it commits everything spooled in
+    one backed up write; writers whose notes went out in that batch find
+    their spool file gone and return. N processes writing at once therefore
+    cost a few lock holds and writes rather than N, and notes spooled by a
+    writer that died before committing go out with the next commit.
+    `python bench_notes.py writers` measures the throughput to expect.
+
+    Parameters
+    ----------
+    `store` : NoteStore
+            notebook to write
+    `notes` : List[str]
+            formatted notes, oldest first
+    `d` : Dict
+            ini params
+
+    Example
+    -------
+        `commit_notes` usage:
+    ```python
+        >>> commit_notes(open_store("mynotes.txt"), ["2021-03-01 09:30:00--misc::buy milk"], d)
+    ```
+    """
+    spool = f"{store.path}.spool"
+    makedirs(spool, exist_ok=True)
+    mine = path.join(spool, f"{time_ns():020d}-{getpid()}.notes")
+    write_atomic(mine, "".join(note + "\n" for note in notes), encoding="utf-8")
+    with notes_lock(store.path):
+        if not path.isfile(mine):  ##went out in another writer's batch
+            return
+        batch = [
+            path.join(spool, name)
+            for name in sorted(listdir(spool))
+            if name.endswith(".notes")
+        ]
+        lines = []
+        for name in batch:
+            with open(name, "r", encoding="utf-8") as f:
+                lines.extend(line.rstrip("\n") for line in f)
+        with backup_log(store, lines, d):
+            store.append_many(lines)
+        for name in batch:
+            remove(name)
+
+
+def normalize_record(record: str, linebreak: str = ";") -> Optional[str]:
+    """
+    `normalize_record` one line to import, either a note in the notes file
+    format or a JSON object, as a formatted note
+
+    JSON objects have a `timestamp` (any ISO 8601 date and time; one with a
+    UTC offset is converted to local time), `topics` (a list, or a string as
+    typed after -t) and a `body` (a string, or a list of thoughts). Topics
+    are normalized with `split_topics`, "MISC" when there are none, and line
+    endings in the body become spaces.
+
+    Parameters
+    ----------
+    `record` : str
+            line to import
+    `linebreak` : str, optional
+            joins the thoughts of a JSON `body` list, by default `";"`
+
+    Returns
+    -------
+    Optional[str]
+        None if `record` is not a valid note
+
+    Example
+    -------
+        `normalize_record` usage:
+    ```python
+        >>> normalize_record('{"timestamp": "2021-03-01T09:30", "topics": ["py"], "body": "x"}')
+        "2021-03-01 09:30:00--PY::x"
+    ```
+    """
+    record = record.strip()
+    if record.startswith("{"):
+        try:
+            fields = json.loads(record)
+            when = datetime.fromisoformat(str(fields["timestamp"]))
+        except (ValueError, TypeError, KeyError):
+            return None
+        if when.tzinfo is not None:  ##same instant, on the local clock notes use
+            when = when.astimezone()
+        topics, body = fields.get("topics", ""), fields.get("body", "")
+        if isinstance(topics, list):
+            topics = ", ".join(str(topic) for topic in topics)
+        if isinstance(body, list):  # "\;" keeps a ";" within a thought
+            body = linebreak.join(
+                str(thought).replace(";", r"\;") if linebreak == ";" else str(thought)
+                for thought in body
+            )
+    else:
+        mat = NOTE_MATCH(record)
+        if mat is None:
+            return None
+        timestamp, topics, body = mat.groups()
+        try:
+            when = datetime.fromisoformat(timestamp)  # rejects e.g. month 13
+        except ValueError:
+            return None
+    topics = ", ".join(split_topics(str(topics))) or "MISC"
+    if "::" in topics:
+        return None
+    body = " ".join(str(body).splitlines())
+    return f"{when:%Y-%m-%d %H:%M:%S}--{topics}::{body}"
+
+
+def import_notes(store: NoteStore, notes: List[str], d: Dict) -> bool:
+    """
+    `import_notes` adds formatted `notes` to `store` as one batch: one lock,
+    one backup (see `backup_log`) and one write with its index update
+
+    The notes are sorted by time first. If they all come after the newest
+    note of `store` they are appended; otherwise the notebook is rewritten
+    with them merged into time order (its sidecar indexes are rebuilt when
+    next used and archive segments are left as they are), and a backup
+    generation starts from the merged notebook.
+
+    Parameters
+    ----------
+    `store` : NoteStore
+            notebook to import into
+    `notes` : List[str]
+            formatted notes (see `normalize_record`), in any order
+    `d` : Dict
+            ini params
+
+    Returns
+    -------
+    bool
+        True if the notes had to be merged in rather than appended
+
+    Example
+    -------
+        `import_notes` usage:
+    ```python
+        >>> import_notes(open_store("mynotes.db"), ["2021-03-01 09:30:00--PY::x"], d)
+        False
+    ```
+    """
+    notes = sorted(notes, key=lambda note: note[:19])  # stable; timestamp prefix
+    with notes_lock(store.path):
+        with backup_log(store, notes, d):
+            newest = next(store.notes(), None) if store.exists() else None
+            if newest is None or newest.timestamp <= notes[0][:19]:
+                store.append_many(notes)
+                return False
+            from heapq import merge
+
+            temp_path = "{0}.importing{1}".format(*path.splitext(store.path))
+            if path.isfile(temp_path):
+                remove(temp_path)
+            merged = open_store(temp_path)  # same backend
+            with PROFILER.span("write"):
+                append_in_batches(
+                    merged,
+                    merge(
+                        store.lines(archived=False), notes, key=lambda note: note[:19]
+                    ),
+                )
+            merged.close()
+            store.close()
+            replace(temp_path, store.path)
+        with PROFILER.span("backup"):  ##a log replays appends, not this merge
+            manifest = load_backup_manifest(store.path)
+            start_backup_generation(store, manifest["generations"], full=True)
+            manifest["stamp"] = get_stamp(store.path)
+            save_backup_manifest(store.path, manifest)
+        return True
+
+
+def restore_notes(store: NoteStore, when: str = None) -> str:
+    """
+    `restore_notes` rebuilds the notebook of `store` from its newest backup
+    generation, or the newest whose name starts with `when`
+
+    The notebook is restored as it was at the end of that generation
+    (snapshot, then its log), less any notes since rolled into archive
+    segments (see `archive_notes`). Its current contents are kept next to it
+    with a `.before-restore` suffix.
+
+    Parameters
+    ----------
+    `store` : NoteStore
+            notebook to restore
+    `when` : str, optional
+            generation name prefix, e.g. "20210301" (see `--restore list`),
+            by default `None`
+
+    Returns
+    -------
+    str
+        name of the generation restored
+
+    Example
+    -------
+        `restore_notes` usage:
+    ```python
+        >>> restore_notes(open_store("mynotes.txt"), "20210301")
+        "20210301-093000-123456"
+    ```
+    """
+    import gzip
+
+    manifest = load_backup_manifest(store.path)
+    names = [
+        generation["name"]
+        for generation in manifest["generations"]
+        if when is None or generation["name"].startswith(when)
+    ]
+    if not names:
+        raise FileNotFoundError(
+            f"no backup of {store.path}" + (f" named {when}*" if when else "")
+        )
+    base = path.join(backup_dir(store.path), names[-1])
+
+    def backed_up_notes() -> Iterator[str]:
+        with gzip.open(f"{base}.gz", "rt", encoding="utf-8") as f:
+            yield from (line.rstrip("\n") for line in f)
+        with open(f"{base}.wal", "r", encoding="utf-8") as f:
+            yield from (line.rstrip("\n") for line in f)
+
+    temp_path = "{0}.restoring{1}".format(*path.splitext(store.path))  # same backend
+    with notes_lock(store.path):
+        archived = {
+            line for seg in list_segments(store.path) for line in read_segment(seg)
+        }
+        if path.isfile(temp_path):
+            remove(temp_path)
+        restored = open_store(temp_path)
+        with PROFILER.span("restore"):
+            append_in_batches(
+                restored, (line for line in backed_up_notes() if line not in archived)
+            )
+        restored.close()
+        store.close()
+        if store.exists():
+            replace(store.path, f"{store.path}.before-restore")
+        replace(temp_path, store.path)
+    return names[-1]
+
+
+SEGMENT_MAGIC = b"NOTESEG1"  ##ends every archive segment, after its footer
+
+
+def archive_dir(p: str) -> str:
+    """`archive_dir` folder holding the archive segments of notes file `p`"""
+    return f"{p}.archive"
+
+
+def list_segments(p: str) -> List[str]:
+    """`list_segments` archive segment paths of notes file `p`, oldest first"""
+    folder = archive_dir(p)
+    if not path.isdir(folder):
+        return []
+    return [
+        path.join(folder, name)
+        for name in sorted(listdir(folder))
+        if name.endswith(".seg")
+    ]
+
+
+def segment_footer(seg: str) -> Dict:
+    """
+    `segment_footer` the footer index of archive segment `seg`: "first" and
+    "last" timestamps, "notes", "size" of the compressed notes, per-topic
+    [count, first, last] "topics", per-day "days" and distinct "tags"
+    (topics as written); cached while the file is unchanged
+    """
+    info = stat(seg)
+    return read_segment_footer(seg, info.st_mtime_ns, info.st_size)
+
+
+@lru_cache(maxsize=1024)
+def read_segment_footer(seg: str, mtime_ns: int, size: int) -> Dict:
+    """`read_segment_footer` see `segment_footer`; the footer is JSON followed
+    by its length (8 bytes) and `SEGMENT_MAGIC`"""
+    with open(seg, "rb") as f:
+        f.seek(size - 16)
+        trailer = f.read(16)
+        if trailer[8:] != SEGMENT_MAGIC:
+            raise ValueError(f"{seg} is not a notes archive segment")
+        length = int.from_bytes(trailer[:8], "big")
+        f.seek(size - 16 - length)
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def read_segment(seg: str) -> List[str]:
+    """`read_segment` decompresses the lines of archive segment `seg`, oldest
+    first"""
+    import gzip
+
+    with open(seg, "rb") as f:
+        body = f.read(segment_footer(seg)["size"])
+    lines = gzip.decompress(body).decode(ENCODING, errors="replace").splitlines()
+    return [line for line in lines if line]
+
+
+def write_segment(p: str, lines: List[str]) -> str:
+    """
+    `write_segment` compresses `lines` (oldest first) into a new archive
+    segment of notes file `p`, named after its first note, with a footer
+    index (see `segment_footer`) of the notes parsed from them
+
+    Returns
+    -------
+    str
+        segment path
+    """
+    import gzip
+
+    notes = list(parse_notes(enumerate(lines)))
+    topics, days = tally_notes(notes)
+    body = gzip.compress("".join(line + "\n" for line in lines).encode(ENCODING), 6)
+    footer = {
+        "first": notes[0].timestamp,
+        "last": notes[-1].timestamp,
+        "notes": len(notes),
+        "size": len(body),
+        "topics": topics,
+        "days": days,
+        "tags": sorted({", ".join(note.topics) for note in notes if note.topics}),
+    }
+    footer = json.dumps(footer).encode("utf-8")
+    name = notes[0].timestamp.replace("-", "").replace(":", "").replace(" ", "-")
+    seg, copies = path.join(archive_dir(p), f"{name}.seg"), 0
+    while path.exists(seg):  # older notes merged in since the last archiving
+        copies += 1  # "_" sorts after ".", keeping `list_segments` oldest first
+        seg = path.join(archive_dir(p), f"{name}_{copies:04d}.seg")
+    with open(f"{seg}.tmp", "wb") as f:
+        f.write(body + footer + len(footer).to_bytes(8, "big") + SEGMENT_MAGIC)
+    replace(f"{seg}.tmp", seg)
+    return seg
+
+
+def segment_notes(seg: str, linebreak: str = ";") -> Iterator[Note]:
+    """`segment_notes` notes of archive segment `seg`, newest first"""
+    yield from parse_notes(
+        ((None, line) for line in reversed(read_segment(seg))), linebreak
+    )
+
+
+def archive_notes(store: NoteStore, before: str) -> int:
+    """
+    `archive_notes` rolls the notes of `store` older than `before` out of the
+    notes file into compressed archive segments, one per month, in the
+    `store`.archive folder
+
+    The notes file keeps only newer notes, so its scans, indexes and backup
+    snapshots stay small. Queries still see archived notes, but decompress
+    only the segments whose footer (time range, topics) can match, and
+    `--stats` and topic listings read just the footers. Archived notes stay
+    in the backups taken before, and are not restored twice by
+    `restore_notes`.
+
+    Parameters
+    ----------
+    `store` : NoteStore
+            notebook to archive; only text notes files are
+    `before` : str
+            "YYYY-MM-DD HH:MM:SS"
+
+    Returns
+    -------
+    int
+        number of lines archived
+
+    Example
+    -------
+        `archive_notes` usage:
+    ```python
+        >>> archive_notes(open_store("mynotes.txt"), "2021-01-01 00:00:00")
+        5120
+    ```
+    """
+    p = store.path
+    with notes_lock(p):
+        ensure_journal(p)
+        with open(p, "rb") as f:
+            try:
+                mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:  # empty file
+                return 0
+        with mm:
+            cut = find_time_offset(mm, before)
+            old, rest = mm[:cut], mm[cut:]
+        months, pending = [], []  # [month, lines]; lines before the first note
+        for line in old.decode(ENCODING, errors="replace").splitlines():
+            line = line.rstrip("\r")
+            if not line:
+                continue
+            if NOTE_MATCH(line) and (not months or months[-1][0] != line[:7]):
+                months.append([line[:7], pending])
+                pending = []
+            (months[-1][1] if months else pending).append(line)
+        if not months:
+            return 0
+        makedirs(archive_dir(p), exist_ok=True)
+        with PROFILER.span("archive"):
+            for _, lines in months:
+                write_segment(p, lines)
+        with open(f"{p}.tmp", "wb") as f:
+            f.write(rest)
+        store.close()
+        replace(f"{p}.tmp", p)
+    return sum(len(lines) for _, lines in months)
+
+
+def collect_stats(notes: Iterable[Note]) -> Dict:
+    """
+    `collect_stats` counts per topic and per day/week/month, and when each
+    topic was first and last seen, in one pass over `notes` (any order)
+
+    Parameters
+    ----------
+    `notes` : Iterable[Note]
+            notes to summarize
+
+    Returns
+    -------
+    Dict
+        see `summarize_stats`
+
+    Example
+    -------
+        `collect_stats` usage:
+    ```python
+        >>> collect_stats(get_notes("mynotes.txt"))["topics"]["PY"]
+        {"notes": 12, "first": "2021-01-04 08:00:00", "last": "2021-03-01 09:30:00"}
+    ```
+    """
+    return summarize_stats(*tally_notes(notes))
+
+
+def tally_notes(
+    notes: Iterable[Note], topics: Dict[str, list] = None, days: Dict[str, int] = None
+) -> Tuple[Dict[str, list], Dict[str, int]]:
+    """
+    `tally_notes` adds `notes` to per-topic [count, first, last] `topics` and
+    per-day counts `days` (new dicts by default), for `summarize_stats`
+    """
+    topics = {} if topics is None else topics
+    days = {} if days is None else days
+    for note in notes:
+        timestamp = note.timestamp
+        day = timestamp[:10]
+        days[day] = days.get(day, 0) + 1
+        for topic in note.topics:
+            seen = topics.get(topic)
+            if seen is None:
+                topics[topic] = [1, timestamp, timestamp]
+            else:
+                seen[0] += 1
+                if timestamp < seen[1]:
+                    seen[1] = timestamp
+                elif timestamp > seen[2]:
+                    seen[2] = timestamp
+    return topics, days
+
+
+def merge_tally(
+    topics: Dict[str, list],
+    days: Dict[str, int],
+    more_topics: Dict[str, list],
+    more_days: Dict[str, int],
+):
+    """`merge_tally` adds the tallies `more_topics`, `more_days` (see
+    `tally_notes`) to `topics`, `days`"""
+    for topic, (count, first, last) in more_topics.items():
+        seen = topics.setdefault(topic, [0, first, last])
+        seen[0] += count
+        seen[1], seen[2] = min(seen[1], first), max(seen[2], last)
+    for day, count in more_days.items():
+        days[day] = days.get(day, 0) + count
+
+
+def summarize_stats(topics: Dict[str, list], days: Dict[str, int]) -> Dict:
+    """
+    `summarize_stats` the `--stats` report from per-topic [count, first,
+    last] and per-day counts; weeks (ISO) and months are rolled up from days
+
+    Returns
+    -------
+    Dict
+        {"notes", "first_day", "last_day", "topics": {topic: {"notes",
+        "first", "last"}} (most notes first), "day", "week", "month":
+        {period: notes} (oldest first)}
+    """
+    weeks, months = {}, {}
+    for day in sorted(days):
+        year, week, _ = datetime.fromisoformat(day).isocalendar()
+        weeks[f"{year}-W{week:02d}"] = weeks.get(f"{year}-W{week:02d}", 0) + days[day]
+        months[day[:7]] = months.get(day[:7], 0) + days[day]
+    return {
+        "notes": sum(days.values()),
+        "first_day": min(days, default=None),
+        "last_day": max(days, default=None),
+        "topics": {
+            topic: {"notes": count, "first": first, "last": last}
+            for topic, (count, first, last) in sorted(
+                topics.items(), key=lambda item: (-item[1][0], item[0])
+            )
+        },
+        "day": dict(sorted(days.items())),
+        "week": weeks,
+        "month": months,
+    }
+
+
+def show_stats(stats: Dict, default_file_path: str, fmt: str = "text"):
+    """
+    `show_stats` prints `stats` (see `summarize_stats`) as a report, or as
+    JSON when `fmt` is "json"; the report lists every topic and month, the
+    last 12 weeks and the last 14 days
+    """
+    if fmt == "json":
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    print(
+        f"\n  Stats for {default_file_path}"
+        + colorama.Fore.MAGENTA
+        + f": {stats['notes']} notes, {stats['first_day']} to {stats['last_day']}"
+        + colorama.Fore.RESET
+    )
+    width = max(map(len, ["TOPIC", *stats["topics"]])) + 2
+    print(f"\n  {'TOPIC':<{width}}{'NOTES':>7}   {'FIRST SEEN':<12}LAST SEEN")
+    for topic, seen in stats["topics"].items():
+        print(
+            f"  {topic:<{width}}{seen['notes']:>7}   "
+            f"{seen['first'][:10]:<12}{seen['last'][:10]}"
+        )
+    sections = (
+        ("Notes per month:", list(stats["month"].items())),
+        (
+            "Notes per week (last 12 weeks with notes):",
+            list(stats["week"].items())[-12:],
+        ),
+        ("Notes per day (last 14 days with notes):", list(stats["day"].items())[-14:]),
+    )
+    for title, rows in sections:
+        print(f"\n  {title}")
+        for key, count in rows:
+            print(f"  {key:<12}{count:>7}")
+
+
+def show_all_topics(
+    topics: List[str], tags: Iterable[str], default_file_path: str
+) -> List[str]:
+    """
+    `show_all_topics` [summary]
+
+    Parameters
+    ----------
+    `topics` : List[str]
+            [description]
+    `tags` : Iterable[str]
+            topics of the notes as written, see `NoteStore.tags`
+    `default_file_path` : str
+            [description]
+
+    Returns
+    -------
+    List[str]
+        [description]
+
+
+
+    Example
+    -------
+        `show_all_topics` usage:
+    ```python
+        >>> show_all_topics()
+        [output]
+    ```
+    """
+
+    topics.remove("ALL")
+    ticker_set = set(tags)
+    print(
+        "\n  Current Topics in {}".format(default_file_path)
+        + colorama.Fore.MAGENTA
+        + ":\n\t{}".format("\n\t".join(list(ticker_set)))
+    )
+    return topics
+
+
+class Pager:
+    """
+    `Pager` splits newest-first `notes` into screens of at most `rows` rows
+    and renders them one at a time, as they are shown
+
+    Page breaks come from the height of each parsed note (see
+    `note_height`), so finding pages (to skip ahead) reads notes but renders
+    none. One worker thread does all reading and rendering, so `page` can
+    render the next page in the background while the current one is read.
+
+    Parameters
+    ----------
+    `notes` : Iterable[Note]
+            notes to page through, newest first
+    `render` : Callable[[Note], str]
+            see `cached_renderer`
+    `rows` : int
+            terminal rows for notes
+    `columns` : int
+            terminal width
+
+    Example
+    -------
+        `Pager` usage:
+    ```python
+        >>> pager = Pager(get_notes("mynotes.txt"), cached_renderer(d), 40, 120)
+        >>> sys.stdout.write(pager.page(0).result())
+        >>> pager.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        notes: Iterable[Note],
+        render: Callable[[Note], str],
+        rows: int,
+        columns: int,
+    ):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.notes = iter(notes)
+        self.render = render
+        self.rows = max(rows, 1)
+        self.columns = max(columns, 20)
+        self.pages = []  # notes of each page found so far
+        self.rendered = {}  # page number -> Future of its text
+        self.worker = ThreadPoolExecutor(1)  ##the only thread reading `notes`
+        self._next = None  # note read, but did not fit on the last page
+
+    def page(self, number: int):
+        """Future of the rendered text of page `number` (None past the end)"""
+        if number not in self.rendered:
+            self.rendered[number] = self.worker.submit(self._render, number)
+        return self.rendered[number]
+
+    def last(self, number: int) -> int:
+        """number of the last page, reading no further than page `number`"""
+        return self.worker.submit(self._fetch, number).result()
+
+    def more(self, number: int) -> bool:
+        """True if there is a page after page `number`; once page `number`
+        is found, known without reading the next one"""
+        if len(self.pages) > number + 1:
+            return True
+        return self.worker.submit(self._more, number).result()
+
+    def find(self, stamp: str) -> int:
+        """number of the page holding the newest note before `stamp` (the last
+        page if there is none)"""
+        return self.worker.submit(self._find, stamp).result()
+
+    def rest(self, number: int) -> Iterator[Note]:
+        """notes after page `number`; call after `close`"""
+        for page in self.pages[number + 1 :]:
+            yield from page
+        if self._next is not None:
+            yield self._next
+        yield from self.notes
+
+    def close(self):
+        """stop the worker, dropping pages rendered ahead"""
+        self.worker.shutdown(wait=True, cancel_futures=True)
+
+    def _fetch(self, number: int) -> int:
+        while len(self.pages) <= number:
+            page, used = [], 0
+            while True:
+                if self._next is None:
+                    self._next = next(self.notes, None)
+                    if self._next is None:
+                        break
+                height = note_height(self._next, self.columns)
+                if page and used + height > self.rows:
+                    break
+                page.append(self._next)
+                used += height
+                self._next = None
+            if not page:
+                break
+            self.pages.append(page)
+        return min(number, len(self.pages) - 1)
+
+    def _more(self, number: int) -> bool:
+        return self._fetch(number) == number and (
+            len(self.pages) > number + 1 or self._next is not None
+        )
+
+    def _render(self, number: int) -> Optional[str]:
+        if self._fetch(number) < number:
+            return None
+        with PROFILER.span("render"):
+            return "".join(self.render(note) for note in self.pages[number])
+
+    def _find(self, stamp: str) -> int:
+        number = 0
+        while self._fetch(number) == number:
+            if self.pages[number][-1].timestamp < stamp:
+                return number
+            number += 1
+        return number - 1
+
+
+def show_non_specific_lines(notes, d, seek=None):
+    """
+    `show_non_specific_lines` pages through newest-first `notes` (see
+    `Pager`), or writes them all when stdout is not a terminal
+
+    A date typed at the prompt jumps to the notes before it: `seek(stamp)`
+    gives those notes (i.e.: `NoteStore.between`, which bisects the journal)
+    and they are paged from their first note, "p" on their first page going
+    back to where the jump was made. Without `seek`, the pages up to that
+    date are laid out from `notes` instead.
+    """
+    load_colorama()
+    if not sys.stdout.isatty():  ##redirected to a file or pager; no prompts
+        write_chunks(render_notes(notes, d))
+        return
+    from shutil import get_terminal_size
+
+    size = get_terminal_size()
+    render = cached_renderer(d)
+    pager = Pager(notes, render, size.lines - 3, size.columns)  ##prompt
+    number, shown, label = 0, None, ""
+    jumps = []  # (pager, page number, label) to go back to
+    try:
+        while True:
+            if shown != number:
+                text = pager.page(number).result()
+                if text is None and jumps:  ##nothing that old
+                    print(f"\tNo notes{label} or older")
+                    pager.close()
+                    pager, number, label = jumps.pop()
+                    shown = None
+                    continue
+                if text is None:  ##no notes at all
+                    return
+                sys.stdout.write(text)
+                shown = number
+                at_end = not pager.more(number)
+                if at_end and number == 0 and not jumps:  ##it all fit on one screen
+                    return
+                pager.page(number + 1)  ##render ahead while this one is read
+            user_input = input(
+                f"\n-- page {number + 1}{label}{' (end)' if at_end else ''} -- "
+                "Enter: next, p: back, +N/-N: pages, a date (i.e.: 2021-03-01, "
+                "7d): jump, e: show all, b: end run\n"
+            ).strip()
+            if user_input in ("", "n"):
+                if at_end:
+                    return
+                number += 1
+            elif user_input == "p":
+                if number == 0 and jumps:  ##back to where the jump was made
+                    pager.close()
+                    pager, number, label = jumps.pop()
+                    shown = None
+                else:
+                    number = max(number - 1, 0)
+            elif match(r"[+-]\d+$", user_input):
+                number = max(pager.last(number + int(user_input)), 0)
+            elif user_input == "e":
+                pager.close()
+                write_chunks(render_notes(pager.rest(number), d))
+                return
+            elif user_input == "b":
+                return
+            else:
+                try:
+                    stamp = parse_when(user_input, end=True)
+                except ValueError as exc:
+                    print(f"\t{exc}")
+                    continue
+                if seek is None:
+                    number = max(pager.find(stamp), 0)
+                    continue
+                jumps.append((pager, number, label))
+                pager = Pager(seek(stamp), render, size.lines - 3, size.columns)
+                number, shown, label = 0, None, f" from {user_input}"
+    except EOFError:
+        pass
+    finally:
+        pager.close()
+        for jumped_from, _, _ in jumps:
+            jumped_from.close()
+
+
+class StyleRegistry:
+    """
+    `StyleRegistry` keyword -> markup styles from styles.ini, loaded once per
+    process
+
+    New keywords (topics seen while rendering) are kept as dirty and appended
+    to styles.ini by `flush`, which runs once on exit. The file is re-read when
+    its mtime changes, checked at most every `check_interval` seconds.
+
+    Parameters
+    ----------
+    `styles_path` : str
+            path to styles.ini
+    `check_interval` : float, optional
+            seconds between mtime checks, by default `1.0`
+
+    Example
+    -------
+        `StyleRegistry` usage:
+    ```python
+        >>> registry = StyleRegistry("path/to/styles.ini")
+        >>> registry.register("PYTHON")
+        >>> registry.styles["PYTHON"]
+        "<FORE-fffb00>"
+        >>> registry.flush()
+    ```
+    """
+
+    def __init__(self, styles_path: str, check_interval: float = 1.0):
+        self.styles_path = styles_path
+        self.check_interval = check_interval
+        self._styles = {}
+        self._dirty = {}
+        self._mtime = None
+        self._checked = None
+        self._version = None
+
+    @property
+    def styles(self) -> Dict[str, str]:
+        """keyword -> markup, reloaded if styles.ini changed on disk"""
+        now = monotonic()
+        if self._checked is None or now - self._checked >= self.check_interval:
+            self._checked = now
+            mtime = self._get_mtime()
+            if mtime != self._mtime or self._mtime is None:
+                self._load()
+                self._mtime = mtime
+        return self._styles
+
+    def load(self) -> Dict[str, str]:
+        """read styles.ini now rather than on first use; see `styles`"""
+        self._checked = None
+        return self.styles
+
+    @property
+    def version(self) -> str:
+        """hash of the current styles, for `RenderCache` keys"""
+        styles = self.styles
+        if self._version is None:
+            from hashlib import blake2b
+
+            content = json.dumps(sorted(styles.items())).encode("utf-8")
+            self._version = blake2b(content, digest_size=8).hexdigest()
+        return self._version
+
+    def register(self, keyword: str, markup: str = "<FORE-fffb00>"):
+        """add `keyword` with default `markup` unless it is already styled"""
+        if keyword not in self.styles:
+            self._styles[keyword] = markup
+            self._dirty[keyword] = markup
+            self._version = None
+
+    def flush(self):
+        """append new keywords to styles.ini (only those not already on disk)"""
+        if not self._dirty:
+            return
+        with notes_lock(self.styles_path):
+            self._append_new()
+        self._dirty.clear()
+        self._mtime = None  # re-read when next checked: others may have added some
+
+    def _append_new(self):
+        on_disk = self._read()
+        new_styles = {k: v for k, v in self._dirty.items() if k not in on_disk}
+        if new_styles:
+            needs_newline = False
+            if path.isfile(self.styles_path) and path.getsize(self.styles_path) > 0:
+                with open(self.styles_path, "rb") as f:
+                    f.seek(-1, SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            with open(self.styles_path, "a") as f:
+                if needs_newline:
+                    f.write("\n")
+                for kw, markup in new_styles.items():
+                    f.write(f"{kw.strip()}={markup.strip()}\n")
+
+    def _get_mtime(self):
+        try:
+            return stat(self.styles_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> Dict[str, str]:
+        if not path.isfile(self.styles_path):
+            return {}
+        contents = get_lines_from_path(self.styles_path)
+        styles_list = [
+            i.split("=")
+            for i in contents
+            if not i.startswith(";") and len(i.strip()) > 0
+        ]  # ; is a comment in ini file
+        return {i[0].upper(): i[1].strip() for i in styles_list}
+
+    def _load(self):
+        with PROFILER.span("styles.load"):
+            self._styles = self._read()
+        for kw, markup in self._dirty.items():  # not flushed yet
+            self._styles.setdefault(kw, markup)
+        self._version = None
+
+
+STYLES = StyleRegistry(STYLES_PATH)
+
+
+def flush_styles():
+    """`flush_styles` writes keywords registered during this run to styles.ini"""
+    with PROFILER.span("styles.flush"):
+        STYLES.flush()
+
+
+atexit.register(flush_styles)
+
+
+class RenderCache:
+    """
+    `RenderCache` rendered notes (see `render_note`) kept in a SQLite file, so
+    listing unchanged history again skips the keyword loop and `make_styles`
+
+    Entries are keyed by a hash of the note's timestamp, topics and body,
+    together with `StyleRegistry.version` and the program version, so editing
+    styles.ini (or a new topic becoming a keyword) renders notes afresh.
+    New entries and hits are written in batches by `flush` (on exit, and
+    every `batch` new entries; hits only when the entry was last marked used
+    over an hour ago). When the entries add up to more than `max_bytes`
+    characters, the least recently used are dropped.
+
+    Parameters
+    ----------
+    `cache_path` : str
+            SQLite file
+    `max_bytes` : int, optional
+            size bound, by default 64 MiB
+    `batch` : int, optional
+            new entries held before writing them, by default `2000`
+
+    Example
+    -------
+        `RenderCache` usage:
+    ```python
+        >>> cache = RenderCache("path/to/render_cache.sqlite3")
+        >>> sys.stdout.write(cache.render(note, d))
+        >>> cache.flush()
+    ```
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS renders (
+            key BLOB PRIMARY KEY,
+            rendered TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            used INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS renders_used ON renders (used);
+    """
+
+    refresh_ns = 3600 * 10**9  ##hits re-mark an entry as used at most hourly
+
+    def __init__(self, cache_path: str, max_bytes: int = 64 << 20, batch: int = 2000):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self._connection = None
+        self._new = {}  # key -> rendered, not written yet
+        self._used = set()  # keys of hits, to mark recently used
+        self._now = time_ns()
+
+    @property
+    def connection(self):
+        """the cache database, created on first use; `False` if unusable"""
+        if self._connection is None:
+            import sqlite3
+
+            try:
+                self._connection = sqlite3.connect(
+                    self.cache_path, timeout=1, check_same_thread=False
+                )  ##rendered in the `Pager` worker, flushed at exit
+                self._connection.execute("PRAGMA journal_mode = WAL")
+                self._connection.execute("PRAGMA synchronous = NORMAL")
+                with self._connection:
+                    self._connection.executescript(self.SCHEMA)
+            except sqlite3.Error:  ##read-only folder, corrupt file: render uncached
+                self._connection = False
+        return self._connection
+
+    def key(self, note: Note) -> bytes:
+        """`key` of `note` under the current styles"""
+        from hashlib import blake2b
+
+        content = "\0".join(
+            (
+                f"{version}",
+                STYLES.version,
+                note.timestamp,
+                "\x1f".join(note.topics),
+                "\x1f".join(note.body),
+            )
+        )
+        return blake2b(
+            content.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+
+    def render(self, note: Note, d: Dict) -> str:
+        """`render_note`, from the cache when possible"""
+        for topic in note.topics:  ##as render_note would; may change STYLES.version
+            STYLES.register(topic)
+        connection = self.connection
+        if connection is False:
+            return render_note(note, d)
+        key = self.key(note)
+        rendered = self._new.get(key)
+        if rendered is None:
+            row = connection.execute(
+                "SELECT rendered, used FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                if row[1] < self._now - self.refresh_ns:
+                    self._used.add(key)
+                return row[0]
+            rendered = render_note(note, d)
+            self._new[key] = rendered
+            if len(self._new) >= self.batch:
+                self.flush()
+        return rendered
+
+    def flush(self):
+        """write new entries, mark hits as recently used and evict down to
+        `max_bytes`; skipped if another process holds the cache too long"""
+        if not self._new and not self._used or not self.connection:
+            return
+        import sqlite3
+
+        now = self._now = time_ns()
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?)",
+                    ((k, r, len(r), now) for k, r in self._new.items()),
+                )
+                self.connection.executemany(
+                    "UPDATE renders SET used = ? WHERE key = ?",
+                    ((now, key) for key in self._used),
+                )
+                if self._new:
+                    self._evict()
+        except sqlite3.OperationalError:  ##busy or full; it is only a cache
+            pass
+        self._new.clear()
+        self._used.clear()
+
+    def _evict(self):
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM renders"
+        ).fetchone()
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        excess += self.max_bytes // 10  ##room for the next runs before evicting again
+        stale = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM renders ORDER BY used"
+        ):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM renders WHERE key = ?", stale)
+
+    def close(self):
+        self.flush()
+        if self._connection:
+            self._connection.close()
+        self._connection = None
+
+
+RENDER_CACHE = RenderCache(RENDER_CACHE_PATH)
+
+
+def flush_render_cache():
+    """`flush_render_cache` writes notes rendered during this run to the cache"""
+    with PROFILER.span("render_cache.flush"):
+        RENDER_CACHE.flush()
+
+
+atexit.register(flush_render_cache)
+
+
+def cached_renderer(d: Dict) -> Callable[[Note], str]:
+    """
+    `cached_renderer` `render_note` for listings, through `RENDER_CACHE`
+    unless `default_render_cache_mb` in the ini is 0
+
+    Parameters
+    ----------
+    `d` : Dict
+            ini params
+
+    Returns
+    -------
+    Callable[[Note], str]
+        note -> coloured output
+
+    Example
+    -------
+        `cached_renderer` usage:
+    ```python
+        >>> render = cached_renderer(d)
+        >>> sys.stdout.write("".join(map(render, get_notes("mynotes.txt"))))
+    ```
+    """
+    megabytes = float(d.get("default_render_cache_mb", 64))
+    if megabytes <= 0:
+        return partial(render_note, d=d)
+    RENDER_CACHE.max_bytes = int(megabytes * (1 << 20))
+    return partial(RENDER_CACHE.render, d=d)
+
+
+def process_line(line, d):
+    load_colorama()
+    sys.stdout.write(render_line(line, d))
+
+
+def render_line(line: str, d: Dict) -> str:
+    """
+    `render_line` formats note `line` for the terminal (see `render_note`)
+
+    Parameters
+    ----------
+    `line` : str
+            note
+    `d` : Dict
+            user-defined parameters from .ini file
+
+    Returns
+    -------
+    str
+        coloured output for the note (empty if `line` is not a note)
+
+    Example
+    -------
+        `render_line` usage:
+    ```python
+        >>> sys.stdout.write(render_line("2021-03-01 09:30:00--misc::buy milk", d))
+    ```
+    """
+    note = parse_note(line, linebreak=d.get("default_linebreak", ";"))
+    return "" if note is None else render_note(note, d)
+
+
+def render_note(note: Note, d: Dict) -> str:
+    """
+    `render_note` formats `note` for the terminal
+
+    Parameters
+    ----------
+    `note` : Note
+            parsed note
+    `d` : Dict
+            user-defined parameters from .ini file
+
+    Returns
+    -------
+    str
+        coloured output for the note, ending with a newline
+    """
+    out = [colorama.Back.BLACK]  ##print it pretty
+    out.append(colorama.Fore.CYAN + f"\n {note.timestamp}" + colorama.Fore.WHITE + "\n")
+    out.append(colorama.Fore.MAGENTA + "  CATEGORIES:" + colorama.Fore.WHITE + "\n")
+    for cat in note.topics:
+        STYLES.register(cat)
+    out.append(topics_text(note.topics))
+    out.append(colorama.Fore.MAGENTA + "  NOTES:" + colorama.Fore.WHITE + "\n")
 
-    note_str = " ".join(
-        (getattr(args, d.get("default_note_flags")[-1].strip()))
-    )  ##(getattr(args, d.get("default_note_flags")[-1].strip())) comes in as a list; convert to string
+    styles = STYLES.styles
+    for l in note.body:
+        if len(l) != 0:  # empty lines not wanted
+            words = l.lower().split()
+            line_list = list(words)
+            for i, item in enumerate(line_list):
+                if "+" in item and ">" not in item:
+                    line_list[i] = f"<FORE-hhhhhh>{item}<RESET>"
 
-    try:  ##read current notes file content
-        with open((default_file_path), "r") as f:
-            string = f.read()
-    except FileNotFoundError:
-        string = ""
+            word_set = set(words)
+            for kw in styles:
+                if kw.lower() in word_set:
+                    indexes = [
+                        i for i, item in enumerate(line_list) if item == kw.lower()
+                    ]  # all occurances in list
+                    for index in indexes:
+                        line_list[
+                            index
+                        ] = f"{styles[kw]}{kw}<RESET>"  # replace with formatting
+            l = " ".join(line_list)  # now we have our formatted string
 
-    try:  ##redundancy to preserve notes
-        copy2((default_file_path), f"COPY - {(default_file_path)}")
-    except FileNotFoundError:
-        print(f"Creating {(default_file_path)}")
-    for topic in topics:
-        show_all_flags = ["ALL", "SHOW", "HELP", "TOPICS"]
-        if topic in show_all_flags:
-            topics.remove(topic)
-            ticker_set = set()
-            try:
-                lines = get_lines_from_path(default_file_path)
-            except FileNotFoundError:
-                print(
-                    f"\n\tNo such file or directory: {(default_file_path)}\n\t>>Add notes to file before using topic tag."
-                )
-            for i, line in enumerate(lines):
-                line_regex = r"\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}--(.*?):"
-                mat = match(line_regex, line)
-                group = mat.group(1)
-                if len(group) > 0:
-                    ticker_set.add(group.upper())
-            print(
-                "\n  Current Topics in {}:".format(default_file_path)
-                + colorama.Fore.MAGENTA
-                + "\n\t{}".format("\n\t".join(list(ticker_set)))
-                + colorama.Fore.WHITE
+            l = make_styles(l)
+
+            out.append(
+                colorama.Fore.CYAN + "    >>" + colorama.Fore.LIGHTWHITE_EX + f"\t{l}\n"
             )
-    with open(
-        (default_file_path), "w"
-    ) as f:  # if we got this far, we want to write notes to file
-        this_note = (
-            str(datetime.today())[:19] + "--misc::" + note_str
-            if topics is None
-            else str(datetime.today())[:19] + "--" + ", ".join(topics) + "::" + note_str
-        )
-        if topics is None:
-            f.write(this_note + "\n" + string)
-        else:
-            f.write(this_note + "\n" + string)
-    process_line(this_note, d)
+    out.append(colorama.Fore.RESET + colorama.Back.RESET + "\n")  ##back to basics
+    return "".join(out)
 
 
-def get_lines_from_path(path):
-    with open(path, "r") as f:
-        lines = f.readlines()
-    return lines
+def topics_text(topics: Tuple[str, ...]) -> str:
+    """`topics_text` the CATEGORIES rows of `render_note`: up to five topics
+    on the first row, four on each after"""
+    out = []
+    for i, cat in enumerate(topics):
+        if i % 4 == 0 and i != 0:
+            nlc = "\n"
+        elif i == len(topics) - 1:
+            nlc = "\n"
+        else:
+            nlc = ","
+        out.append(f"   {cat}{nlc}")
+    return "".join(out)
 
 
-def show_all_topics(
-    topics: List[str], lines: List[str], default_file_path: str
-) -> List[str]:
+def note_height(note: Note, columns: int = 80) -> int:
     """
-    `show_all_topics` [summary]
+    `note_height` terminal rows `note` takes once rendered (see
+    `render_note`) on a terminal `columns` wide, counted from the parsed
+    note without rendering it
+
+    Markup in the body is counted as text, except that `>>>` gains a space
+    (see `make_styles`), so a body using markup may be counted taller
+    than it is, never shorter.
 
     Parameters
     ----------
-    `topics` : List[str]
-            [description]
-    `lines` : List[str]
-            [description]
-    `default_file_path` : str
-            [description]
+    `note` : Note
+            parsed note
+    `columns` : int, optional
+            terminal width, by default `80`
 
     Returns
     -------
-    List[str]
-        [description]
-
-
+    int
+        rows, including blank lines
 
     Example
     -------
-        `show_all_topics` usage:
+        `note_height` usage:
     ```python
-        >>> show_all_topics()
-        [output]
+        >>> note_height(parse_note("2021-03-01 09:30:00--misc::buy milk;call mum"))
+        8
     ```
     """
-
-    topics.remove("ALL")
-    ticker_set = set()
-    for line in lines:
-        mat = match(r"\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}--(.*?):", line)
-        group = mat.group(1)
-        if len(group) > 0:
-            ticker_set.add(group.upper())
-    print(
-        "\n  Current Topics in {}".format(default_file_path)
-        + colorama.Fore.MAGENTA
-        + ":\n\t{}".format("\n\t".join(list(ticker_set)))
-    )
-    return topics
+    rows = 5  ##blank line, timestamp, CATEGORIES, NOTES, blank line
+    rows += text_height(topics_text(note.topics), columns)
+    for thought in note.body:
+        if len(thought) != 0:  # as in `render_note`
+            line = " ".join(thought.lower().split())
+            width = len("    >>\t".expandtabs()) + len(line) + line.count(">>>")
+            rows += max(-(-width // columns), 1)
+    return rows
 
 
-def show_non_specific_lines(lines, d):
-    output_limiter = 5
-    for i, line in enumerate(lines):
-        if i != 0 and i % output_limiter == 0:
-            user_input = input("\nEnter to continue (e to exit loop, b to end run)\n")
-            if user_input == "e":
-                output_limiter = 1000
-            if user_input == "b":
-                break
-        process_line(line, d)
+ANSI_CODE = compile_regex(r"\x1b\[[0-9;]*[A-Za-z]")  ##colour codes take no room
 
 
-def process_line(line, d):
-    line = line.replace(r"\;", r"~~")
-    fmtline1 = "--Categories: ".join(line.strip().split("--"))
-    fmtline2 = [fmtline1.split("::")[0].upper()] + [
-        i.strip()
-        for i in fmtline1.split("::")[1].split(d.get("default_linebreak", ";"))
-    ]
-    fmtline2 = [i.replace("~~", ";") for i in fmtline2]
-    print(colorama.Back.BLACK, end="")  ##print it pretty
+def text_height(text: str, columns: int = 80) -> int:
+    """
+    `text_height` terminal rows `text` (i.e.: a note as `render_note`
+    rendered it) takes on a terminal `columns` wide: colour codes take no
+    room, tabs stop every 8 columns and long lines wrap
 
-    styles_path = path.join(THIS_DIR, "styles.ini")
+    Parameters
+    ----------
+    `text` : str
+            rendered text
+    `columns` : int, optional
+            terminal width, by default `80`
 
-    if path.isfile(styles_path):
-        contents = get_lines_from_path(styles_path)
-        styles_list = [
-            i.split("=")
-            for i in contents
-            if not i.startswith(";") and len(i.strip()) > 0
-        ]  # ; is a comment in ini file
-        styles = {i[0].upper(): i[1].strip() for i in styles_list}
+    Returns
+    -------
+    int
+        rows, including blank lines
 
-    else:
-        styles = {}
-        contents = []
-    for l in fmtline2:
-        if "--CATEGORIES" in l:
-            print(colorama.Fore.CYAN + f'\n {l.split("--")[0]}' + colorama.Fore.WHITE)
-            print(
-                colorama.Fore.MAGENTA
-                + f'  {l.split("--")[1][:11]}'
-                + colorama.Fore.WHITE
-            )
-            cats = l.split("--")[1][11:].strip()
-            split_char = "," if "," in cats else " "
-            cats = cats.split(split_char)
-            cats = [i.strip().upper() for i in cats]
-            for i, cat in enumerate(cats):
-                if cat.upper().strip() not in styles.keys():
-                    styles[cat.upper().strip()] = "<FORE-fffb00>"
-                if i % 4 == 0 and i != 0:
-                    nlc = "\n"
-                elif i == len(l.split("--")[1][11:].split(",")) - 1:
-                    nlc = "\n"
-                else:
-                    nlc = ","
-                print(f"   {cat}", end=nlc)
-            print(colorama.Fore.MAGENTA + "  NOTES:" + colorama.Fore.WHITE)
-        else:
-            if len(l) != 0:  # empty lines not wanted
-                line_list = l.lower().split()
-                for i, item in enumerate(line_list):
-                    if "+" in item and ">" not in item:
-                        line_list[i] = f"<FORE-hhhhhh>{item}<RESET>"
+    Example
+    -------
+        `text_height` usage:
+    ```python
+        >>> text_height("\x1b[36m    >>\x1b[97m\tdeploy\n", 80)
+        1
+    ```
+    """
+    lines = ANSI_CODE.sub("", text).split("\n")
+    if lines[-1] == "":  # text ends with a newline
+        lines.pop()
+    return sum(max(-(-len(line.expandtabs()) // columns), 1) for line in lines)
 
-                for kw in styles:
 
-                    if kw.lower() in l.lower().split():
+def render_notes(notes: Iterable[Note], d: Dict) -> Iterator[str]:
+    """`render_notes` lazily renders each of `notes` (see `cached_renderer`)"""
+    render = cached_renderer(d)
+    for note in notes:
+        with PROFILER.span("render"):
+            rendered = render(note)
+        yield rendered
 
-                        indexes = [
-                            i for i, item in enumerate(line_list) if item == kw.lower()
-                        ]  # all occurances in list
-                        for index in indexes:
-                            line_list[
-                                index
-                            ] = f"{styles[kw]}{kw}<RESET>"  # replace with formatting
-                l = " ".join(line_list)  # now we have our formatted string
 
-                l = make_styles(l)
+def write_chunks(chunks: Iterable[str], out=None, chunk_size: int = 1 << 16):
+    """
+    `write_chunks` writes `chunks` to `out` in buffers of about `chunk_size`
+    characters, so output costs a handful of large writes instead of several
+    small ones per note
 
-                print(
-                    colorama.Fore.CYAN
-                    + "    >>"
-                    + colorama.Fore.LIGHTWHITE_EX
-                    + f"\t{l}"
-                )
-    print(colorama.Fore.RESET + colorama.Back.RESET)  ##back to basics
+    Parameters
+    ----------
+    `chunks` : Iterable[str]
+            text to write, e.g. `render_notes(...)`
+    `out` : TextIO, optional
+            stream, by default `sys.stdout`
+    `chunk_size` : int, optional
+            characters buffered before each write, by default `1 << 16`
 
-    with open(styles_path, "w") as f:
-        for line in contents:
-            if line.startswith(";"):
-                f.write(line)
-                continue
-        for kw in styles:
-            f.write(f"{kw.strip()}={styles[kw].strip()}\n")
+    Example
+    -------
+        `write_chunks` usage:
+    ```python
+        >>> write_chunks(render_notes(get_notes_by_topics("mynotes.txt", ["PY"]), d))
+    ```
+    """
+    if out is None:
+        load_colorama()
+        out = sys.stdout
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            with PROFILER.span("output.write"):
+                out.write("".join(buffer))
+            buffer, size = [], 0
+    with PROFILER.span("output.write"):
+        if buffer:
+            out.write("".join(buffer))
+        out.flush()
 
 
 def make_styles(line):
+    """`make_styles` markup tokens in `line` to ANSI codes, one `str.replace`
+    per token in order: on note-sized fragments that beats a single regex
+    pass (see `python bench_notes.py make_styles`)"""
     line = (
         line.replace("<FORE-fffb00>", colorama.Fore.YELLOW)
         .replace("<FORE-3afa00>", colorama.Fore.GREEN)
@@ -440,6 +4149,290 @@ def make_styles(line):
     return line
 
 
+class PipeLines:
+    """
+    `PipeLines` lines of piped stdin, read on the event loop (`add_reader`)
+    rather than by `input` on a thread, so a prompt still waiting at exit
+    leaves no thread inside the buffered `sys.stdin`
+
+    Parameters
+    ----------
+    `fd` : int
+            file descriptor of a pipe or socket
+
+    Example
+    -------
+        `PipeLines` usage:
+    ```python
+        >>> lines = PipeLines.of_stdin()
+        >>> topics = await read_input("Topics: ", lines)
+    ```
+    """
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.buffer = b""
+        self.ended = False
+
+    @classmethod
+    def of_stdin(cls) -> Optional["PipeLines"]:
+        """for stdin if the running loop can watch it (a pipe, not a terminal
+        or a file, and not the Windows event loop); None otherwise"""
+        import asyncio
+        from io import UnsupportedOperation
+
+        loop = asyncio.get_running_loop()
+        try:
+            if sys.stdin.isatty():  ##`input` keeps line editing and history
+                return None
+            fd = sys.stdin.fileno()
+            loop.add_reader(fd, int)
+            loop.remove_reader(fd)
+        except (NotImplementedError, OSError, UnsupportedOperation, ValueError):
+            return None  # i.e.: regular files can not be watched
+        return cls(fd)
+
+    async def readline(self) -> str:
+        """next line, without its line ending; EOFError at the end"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while b"\n" not in self.buffer and not self.ended:
+            readable = loop.create_future()
+            loop.add_reader(
+                self.fd, lambda: readable.done() or readable.set_result(None)
+            )
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self.fd)
+            chunk = read_fd(self.fd, 1 << 16)
+            self.ended = not chunk
+            self.buffer += chunk
+        if not self.buffer:
+            raise EOFError
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        encoding = getattr(sys.stdin, "encoding", None) or ENCODING
+        return line.decode(encoding, errors="replace").rstrip("\r")
+
+
+async def read_input(prompt: str, lines: Optional[PipeLines] = None) -> str:
+    """
+    `read_input` awaits `input(prompt)`, so the event loop keeps running (the
+    writer saves notes meanwhile): from `lines` if given, otherwise read on
+    a daemon thread, which a prompt still waiting at exit does not hold open
+    """
+    import asyncio
+    import threading
+
+    if lines is not None:
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        return await lines.readline()
+
+    loop = asyncio.get_running_loop()
+    answer = loop.create_future()
+
+    def settle(method, value):
+        if not answer.done():  # the loop may have stopped waiting
+            method(value)
+
+    def read():
+        try:
+            result = (answer.set_result, input(prompt))
+        except Exception as exc:  # EOFError at the end of piped input
+            result = (answer.set_exception, exc)
+        try:
+            loop.call_soon_threadsafe(settle, *result)
+        except RuntimeError:  # loop closed: the loop mode has ended
+            pass
+
+    threading.Thread(target=read, name="loop-input", daemon=True).start()
+    return await answer
+
+
+def commit_or_print(store: NoteStore, notes: List[str], d: Dict):
+    """`commit_or_print` last try at `commit_notes`; if it fails too, the
+    notes are printed to stderr so they can be added back by hand"""
+    try:
+        commit_notes(store, notes, d)
+    except OSError as exc:
+        print(f"\n\tCould not save notes: {exc}. Not saved:", file=sys.stderr)
+        for note in notes:
+            print(f"\t{note}", file=sys.stderr)
+
+
+async def write_behind(
+    queue: "asyncio.Queue",
+    store: NoteStore,
+    d: Dict,
+    max_notes: int = 20,
+    max_delay: float = 2.0,
+):
+    """
+    `write_behind` the loop's writer task: commits the notes put on `queue`
+    (see `commit_notes`) and mirrors them (see `ensure_redundancy`) off the
+    event loop, until it gets `None`
+
+    A batch goes out once `max_notes` notes are waiting or the oldest has
+    waited `max_delay` seconds, and whatever is queued when `None` arrives.
+    A batch that fails to save is retried with the next one, and tried a
+    last time when the queue closes (see `commit_or_print`). If the task is
+    cancelled instead, the thread still saving finishes first, since
+    `notes_lock` does not tell threads apart; then what is queued is
+    committed before it stops, so no note typed is lost.
+
+    Parameters
+    ----------
+    `queue` : asyncio.Queue
+            formatted notes, then `None`
+    `store` : NoteStore
+            notebook to write
+    `d` : Dict
+            ini params, for `commit_notes`
+    `max_notes` : int, optional
+            batch size that triggers a commit, by default `20`
+    `max_delay` : float, optional
+            seconds a note may wait, by default `2.0`
+
+    Example
+    -------
+        `write_behind` usage:
+    ```python
+        >>> queue = asyncio.Queue()
+        >>> writer = asyncio.create_task(write_behind(queue, open_store("mynotes.txt"), d))
+        >>> queue.put_nowait("2021-03-01 09:30:00--misc::buy milk")
+        >>> queue.put_nowait(None)
+        >>> await writer
+    ```
+    """
+    import asyncio
+
+    pending, first, closed = [], None, False
+    saving, batch = None, []  # thread at work, and the notes it is committing
+    try:
+        while True:
+            waiting = len(pending) < max_notes and (
+                not pending or monotonic() - first < max_delay
+            )
+            if waiting and not closed:
+                timeout = first + max_delay - monotonic() if pending else None
+                try:
+                    note = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:  # the oldest note is due
+                    continue
+                if note is None:
+                    closed = True
+                else:
+                    first = first if pending else monotonic()
+                    pending.append(note)
+                continue
+            if not pending:  # closed, nothing left
+                return
+            batch, pending = pending, []
+            saving = asyncio.ensure_future(
+                asyncio.to_thread(commit_notes, store, batch, d)
+            )
+            try:
+                await asyncio.shield(saving)
+            except OSError as exc:
+                saving = None
+                if closed:  ##nothing else is coming: a last try, or show them
+                    commit_or_print(store, batch, d)
+                    return
+                print(f"\n\tCould not save notes yet: {exc}", file=sys.stderr)
+                pending[:0] = batch  ##retried with the next batch
+                first = monotonic()
+                continue
+            saving, batch = None, []
+            saving = asyncio.ensure_future(
+                asyncio.to_thread(ensure_redundancy, REDUNDANCY_PATH, store.path)
+            )
+            try:
+                await asyncio.shield(saving)
+            except OSError as exc:  ##saved; mirrored on a later run
+                print(f"\n\tCould not update {REDUNDANCY_PATH}: {exc}", file=sys.stderr)
+            saving = None
+    except asyncio.CancelledError:  ##Ctrl-C or SIGTERM while saving: finish here
+        if saving is not None:
+            await asyncio.wait({saving})  # not cancelled again by this wait
+            if saving.exception() is not None:
+                pending[:0] = batch
+        while not queue.empty():
+            note = queue.get_nowait()
+            if note is not None:
+                pending.append(note)
+        if pending:
+            commit_or_print(store, pending, d)
+        raise
+
+
+async def take_notes(store: NoteStore, user_topics: str, d: Dict):
+    """
+    `take_notes` the loop mode: prompts for topics and notes and shows each
+    note at once, while `write_behind` saves them in a background task
+
+    Typing "-e"/"--exit", the end of piped input, Ctrl-C, SIGTERM and SIGHUP
+    (closing the terminal) all end the loop the same way: the writer is told to stop and awaited, so every
+    note typed is saved first.
+    """
+    import asyncio
+    import signal
+
+    linebreak = d.get("default_linebreak", ";")
+    creating = not store.exists()
+    queue = asyncio.Queue()
+    writer = asyncio.create_task(
+        write_behind(
+            queue,
+            store,
+            d,
+            max_notes=int(d.get("default_loop_flush_notes", 20)),
+            max_delay=float(d.get("default_loop_flush_seconds", 2)),
+        )
+    )
+    for name in ("SIGTERM", "SIGHUP"):  # SIGHUP: the terminal was closed
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                getattr(signal, name), asyncio.current_task().cancel
+            )
+        except (NotImplementedError, AttributeError):  ##windows: Ctrl-C only
+            pass
+    lines = PipeLines.of_stdin()  # None at a terminal: read by `input`
+    try:
+        while True:  ##enter loop and take notes until user breaks out
+            user_input = await read_input(
+                f"Enter comma-separated topics. Previous Topics: {user_topics}\n\t",
+                lines,
+            )
+            if user_input == "-e" or user_input == "--exit":
+                break
+            if user_input != "-s":
+                user_topics = user_input if user_input != "" else "misc"
+            user_input = await read_input(
+                f"Enter Note (separate thoughts denoted by {linebreak}):\n\t", lines
+            )
+            if user_input == "-e" or user_input == "--exit":
+                break
+            if creating:
+                print(f"Creating {store.path}")
+                creating = False
+
+            this_note = (
+                str(datetime.today())[:19] + "--" + user_topics + "::" + user_input
+            )
+            queue.put_nowait(this_note)  ##saved in the background
+            process_line(this_note, d)  # pretty print thoughts as they're typed
+    except (EOFError, asyncio.CancelledError):  ##end of piped input, Ctrl-C, signals
+        try:
+            print()
+        except OSError:  # SIGHUP: no terminal left to write to
+            pass
+    finally:
+        queue.put_nowait(None)
+        await writer
+
+
 def process_loop(args, init_dict={}):
     # d = init_dict
     print(  ##loop instructions
@@ -447,80 +4440,25 @@ def process_loop(args, init_dict={}):
         'Type "-s" when specifying topics to keep previous topics.\n\t'
         f'Denote line breaks with "{init_dict.get("default_linebreak", ";")}" when typing notes.\n'
     )
-    if path.isfile(
-        (getattr(args, init_dict.get("default_changefilename_flags")[-1].strip()))
-    ):  ##grab most recent topics on file
-        with open(
-            (getattr(args, init_dict.get("default_changefilename_flags")[-1].strip())),
-            "r",
-            encoding="latin1",
-        ) as f:
-            line = f.readline()
-        mat = match(r"^.*--(.*)::", line)
-        user_topics = mat.group(1) if mat else "misc"
+    import asyncio
+
+    notes_path = getattr(
+        args, init_dict.get("default_changefilename_flags")[-1].strip()
+    )
+    store = open_store(notes_path)
+    if store.exists():  ##grab most recent topics on file
+        note = next(store.notes(), None)
+        user_topics = ", ".join(note.topics) if note and note.topics else "misc"
     else:
         user_topics = "misc"
-    while True:  ##enter loop and take notes until user breaks out
-        user_input = input(
-            f"Enter comma-separated topics. Previous Topics: {user_topics}\n\t"
-        )
-        if user_input == "-e" or user_input == "--exit":
-            break
-        if user_input != "-s":
-            user_topics = user_input if user_input != "" else "misc"
-        user_input = input(
-            f'Enter Note (separate thoughts denoted by {init_dict.get("default_linebreak", ";")}):\n\t'
-        )
-        if user_input == "-e" or user_input == "--exit":
-            break
-        try:
-            with open(
-                (
-                    getattr(
-                        args, init_dict.get("default_changefilename_flags")[-1].strip()
-                    )
-                ),
-                "r",
-            ) as f:
-                string = f.read()
-        except FileNotFoundError:
-            string = ""
-
-        try:
-            copy2(
-                (
-                    getattr(
-                        args, init_dict.get("default_changefilename_flags")[-1].strip()
-                    )
-                ),
-                f'COPY - {(getattr(args, init_dict.get("default_changefilename_flags")[-1].strip()))}',
-            )
-        except FileNotFoundError:
-            print(
-                f'Creating {(getattr(args, init_dict.get("default_changefilename_flags")[-1].strip()))}'
-            )
-
-        with open(
-            (getattr(args, init_dict.get("default_changefilename_flags")[-1].strip())),
-            "w",
-        ) as f:
-            f.write(
-                str(datetime.today())[:19]
-                + "--"
-                + user_topics
-                + "::"
-                + user_input
-                + "\n"
-                + string
-            )
-
-        process_line(
-            str(datetime.today())[:19] + "--" + user_topics + "::" + user_input,
-            init_dict,
-        )  # pretty print thoughts as they're typed
+    try:
+        asyncio.run(take_notes(store, user_topics, init_dict))
+    except KeyboardInterrupt:  ##Ctrl-C outside of a prompt; notes already saved
+        print()
 
 
 def init_args(d):
+    from argparse import ArgumentParser
 
     parser = ArgumentParser(
         prog="Notes > Memory",
@@ -585,6 +4523,93 @@ def init_args(d):
         f"note being added - - - - - - - - - - - - - - - - - - - execute alone to output notes associated with entered "
         f'flag(s); execute flag -{str(d.get("default_topic_flags", "t"))} ALL to see all current topics in {d.get("default_file")}',
     )
+    parser.add_argument(
+        "--search",
+        nargs="+",
+        help="output notes containing every word entered; wrap words in quotes "
+        "(i.e.: '\"exact phrase\"') to match them as a phrase - - - - - - - - - - "
+        "combine with topic flag(s) to search within those topics",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="WHEN",
+        help="only output notes from WHEN on: a date (i.e.: 2021-03-01), a time "
+        "(i.e.: '2021-03-01 09:30'), an age (i.e.: 12h, 7d, 2w), today or yesterday "
+        "- - - combine with topic flag(s), --search and --until",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="WHEN",
+        help="only output notes from before WHEN (a date includes that day); "
+        "same values as --since",
+    )
+    parser.add_argument(
+        "--notebooks",
+        nargs="+",
+        metavar="FILE",
+        help="output notes from all these notes files (or globs, i.e.: "
+        "'projects/*.txt') instead of the notes file, newest first, queried in "
+        "parallel - - - combine with topic flag(s), --search, --since and --until",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="text",
+        metavar="DEST",
+        help="print a timing breakdown of this run to stderr on exit; DEST is "
+        "text (default), json, or a .json file to write (also: NOTES_PROFILE=DEST)",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="DEST",
+        help="copy every note of the notes file to DEST, a new text file or SQLite "
+        "database (.db, .sqlite, .sqlite3); use a database as the notes file "
+        "(i.e.: -f mynotes.db) for indexed queries and transactional writes",
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="summarize the notes file: notes per topic with first and last "
+        "seen dates, and notes per day, week and month; json for all of it",
+    )
+    parser.add_argument(
+        "--import",
+        nargs="?",
+        const="-",
+        metavar="SRC",
+        help="add every note in SRC (default: stdin) in one go; one note per line, "
+        "either in the notes file format or as JSON objects with timestamp, "
+        "topics and body (i.e.: an export from another tool)",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="?",
+        const=d.get("default_archive_after", "365d"),
+        metavar="AGE",
+        help="move notes older than AGE (i.e.: 26w, or a date; default: "
+        "default_archive_after in the ini) out of the notes file into compressed "
+        "monthly segments in <notes file>.archive; they are still listed and "
+        "searched, but only segments that can match are read",
+    )
+    parser.add_argument(
+        "--restore",
+        nargs="?",
+        const="latest",
+        metavar="WHEN",
+        help="rebuild the notes file from its newest backup, or the newest one "
+        "whose name starts with WHEN (i.e.: 20210301); --restore list shows them. "
+        "Backups are kept in <notes file>.backups; see default_backup_retention "
+        "and default_backup_snapshot_every in the ini",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay running, keeping notes indexes, styles and settings in memory, "
+        f"and answer other notes commands over {DAEMON_SOCKET} (also: "
+        "NOTES_SOCKET=PATH); commands read files directly when it is not running",
+    )
     return parser
 
 
@@ -620,20 +4645,76 @@ def get_user_flags(d: dict, init_parameter: str, default_flags: str = []) -> lis
     ]
 
 
-def process_init():
+CONFIG_CACHE = {}  ##init path -> ((size, mtime_ns), config)
+PARSER_CACHE = {}  ##config as json -> parser
+
+
+def load_config(init_path: str) -> Dict[list, str]:
+    """
+    `load_config` ini params for `init_path`, re-read only when the file changes
+
+    Parameters
+    ----------
+    `init_path` : str
+            path to the ini file; created with defaults if missing
+
+    Returns
+    -------
+    Dict[list, str]
+            a fresh copy of the config, safe to modify
+
+    Example
+    -------
+    ```python
+        >>> load_config(INIT_FILE)["default_file"]
+        'mynotes.txt'
+    ```
+    """
+    cached = CONFIG_CACHE.get(init_path)
+    if cached is not None and path.isfile(init_path):
+        if cached[0] == get_stamp(init_path):
+            return dict(cached[1])
+    d = process_user_input(initialize_defaults(), init_path)
+    CONFIG_CACHE[init_path] = (get_stamp(init_path), dict(d))
+    return d
 
-    d = initialize_defaults()
 
-    d = process_user_input(d, path)
+def get_parser(d: Dict[list, str]):
+    """
+    `get_parser` argument parser for config `d`, built once per distinct config
+
+    Example
+    -------
+    ```python
+        >>> get_parser(d) is get_parser(dict(d))
+        True
+    ```
+    """
+    key = json.dumps(d, sort_keys=True, default=str)
+    if key not in PARSER_CACHE:
+        PARSER_CACHE[key] = init_args(d)
+    return PARSER_CACHE[key]
+
 
-    parser = init_args(d)
+def process_init():
+
+    d = load_config(INIT_FILE)
+
+    parser = get_parser(d)
 
     args = parser.parse_args()
 
+    note_flags = [flag.strip() for flag in d.get("default_note_flags")]
+    if args.notebooks is not None and getattr(args, note_flags[-1]) is not None:
+        parser.error(
+            f"--notebooks only reads notes; add -{note_flags[0]}/--{note_flags[-1]} "
+            "notes to one notes file (-f FILE) instead"
+        )
+
     return d, args
 
 
-def process_user_input(d: Dict[list, str], path: str) -> Dict[list, str]:
+def process_user_input(d: Dict[list, str], init_path: str) -> Dict[list, str]:
     """
     `process_user_input` grab ini params, if exist; otherwise create ini with defaults
 
@@ -641,7 +4722,7 @@ def process_user_input(d: Dict[list, str], path: str) -> Dict[list, str]:
     ----------
     `d` : Dict[list, str]
             default ini parameters
-    `path` : str
+    `init_path` : str
             path to .ini file
 
     Returns
@@ -664,13 +4745,19 @@ def process_user_input(d: Dict[list, str], path: str) -> Dict[list, str]:
             "default_note_flags": ["n", "a", "note"],
             "default_open_flags": ["o", "openfile"],
             "default_topic_flags": ["t", "topic"],
+            "default_backup_retention": "5",
+            "default_backup_snapshot_every": "1000",
+            "default_loop_flush_notes": "20",
+            "default_loop_flush_seconds": "2",
+            "default_archive_after": "365d",
+            "default_render_cache_mb": "64",
             }
     ```
     """
-    if path.isfile(path):  ##process path indicated above if exists
-        d = grab_user_input_from_ini(d, path)
+    if path.isfile(init_path):  ##process path indicated above if exists
+        d = grab_user_input_from_ini(d, init_path)
     else:  ##path not existing; create and initialize defaults
-        create_init_file(d, path)
+        create_init_file(d, init_path)
     return d
 
 
@@ -684,12 +4771,13 @@ def create_init_file(d: Dict[list, str], path: str):
     `path` : str
             path to .ini
     """
-    with open(path, "w") as f:  # defaults from dictionary above
-        for k, v in d.items():
-            if type(v) == list:
-                f.write(f'{k}={",".join(v)}\n')
-            else:
-                f.write(f"{k}={v}\n")
+    lines = []  # defaults from dictionary above
+    for k, v in d.items():
+        if type(v) == list:
+            lines.append(f'{k}={",".join(v)}\n')
+        else:
+            lines.append(f"{k}={v}\n")
+    write_atomic(path, "".join(lines))
 
 
 def grab_user_input_from_ini(d: dict, path: str) -> Dict[list, str]:
@@ -722,6 +4810,12 @@ def grab_user_input_from_ini(d: dict, path: str) -> Dict[list, str]:
             "default_note_flags": ["n", "a", "note"],
             "default_open_flags": ["o", "openfile"],
             "default_topic_flags": ["t", "topic"],
+            "default_backup_retention": "5",
+            "default_backup_snapshot_every": "1000",
+            "default_loop_flush_notes": "20",
+            "default_loop_flush_seconds": "2",
+            "default_archive_after": "365d",
+            "default_render_cache_mb": "64",
             }
     ```
     """
@@ -759,6 +4853,12 @@ def initialize_defaults() -> Dict[list, str]:
             "default_note_flags": ["n", "a", "note"],
             "default_open_flags": ["o", "openfile"],
             "default_topic_flags": ["t", "topic"],
+            "default_backup_retention": "5",
+            "default_backup_snapshot_every": "1000",
+            "default_loop_flush_notes": "20",
+            "default_loop_flush_seconds": "2",
+            "default_archive_after": "365d",
+            "default_render_cache_mb": "64",
             }
     ```
     """
@@ -772,6 +4872,12 @@ def initialize_defaults() -> Dict[list, str]:
         "default_note_flags": ["n", "a", "note"],
         "default_open_flags": ["o", "openfile"],
         "default_topic_flags": ["t", "topic"],
+        "default_backup_retention": "5",
+        "default_backup_snapshot_every": "1000",
+        "default_loop_flush_notes": "20",
+        "default_loop_flush_seconds": "2",
+        "default_archive_after": "365d",
+        "default_render_cache_mb": "64",
     }
     return d
 
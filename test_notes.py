@@ -0,0 +1,624 @@
+"""
+Checks for notes.py
+
+    python -m pytest -q test_notes.py
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import product
+from types import SimpleNamespace
+
+import pytest
+
+import notes
+from bench_notes import (
+    OVERLAPPING,
+    generate_fragments,
+    generate_notes_file,
+    make_styles_chained,
+    topic_names,
+)
+
+
+@pytest.fixture(autouse=True)
+def sandbox(tmp_path, monkeypatch):
+    """styles.ini, the render cache and the redundancy mirror in `tmp_path`"""
+    styles_path = str(tmp_path / "styles.ini")
+    monkeypatch.setattr(notes, "STYLES_PATH", styles_path)
+    monkeypatch.setattr(notes, "STYLES", notes.StyleRegistry(styles_path))
+    cache = notes.RenderCache(str(tmp_path / "render_cache.sqlite3"))
+    monkeypatch.setattr(notes, "RENDER_CACHE", cache)
+    monkeypatch.setattr(notes, "REDUNDANCY_PATH", str(tmp_path / "redundancy.txt"))
+    yield
+    cache.close()
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    p = str(tmp_path / "notes.txt")
+    generate_notes_file(p, 3000)
+    return p
+
+
+@pytest.mark.parametrize("fragment", OVERLAPPING)
+def test_make_styles_overlapping_tokens(fragment):
+    assert notes.make_styles(fragment) == make_styles_chained(fragment)
+
+
+def test_make_styles_corpus():
+    for fragment in generate_fragments(2000):
+        assert notes.make_styles(fragment) == make_styles_chained(fragment)
+
+
+def test_make_styles_every_short_fragment():
+    for chars in product("<>/hmgbr x", repeat=5):
+        fragment = "".join(chars)
+        assert notes.make_styles(fragment) == make_styles_chained(fragment)
+
+
+def test_topic_index_matches_scan(notebook):
+    every = list(notes.get_notes(notebook))
+    for topics in (["THE"], ["the", "DEPLOY"], ["PY"], [topic_names(400)[-1]]):
+        wanted = set(notes.split_topics(",".join(topics)))
+        found = [note.offset for note in notes.get_notes_by_topics(notebook, topics)]
+        assert found == [note.offset for note in every if wanted & set(note.topics)]
+
+
+def test_topic_index_follows_appends(notebook):
+    notes.load_index(notebook, "topics")
+    notes.append_notes(notebook, ["2030-01-01 09:30:00--NEWTOPIC, THE::added"])
+    assert notes.index_is_current(notebook, "topics")
+    with open(notebook, "a") as f:  # written behind the index's back
+        f.write("2030-01-02 09:30:00--NEWTOPIC::edited by hand\n")
+    assert not notes.index_is_current(notebook, "topics")
+    found = notes.get_notes_by_topics(notebook, ["newtopic"])
+    assert [note.body for note in found] == [("edited by hand",), ("added",)]
+
+
+@pytest.mark.parametrize(
+    "query", ["deploy", "deploy review", '"the function"', "zyzzyva", 'a "to of"']
+)
+def test_search_index_matches_scan(notebook, query):
+    phrases = notes.parse_search_query(query)
+    wanted = [
+        note.offset
+        for note in notes.get_notes(notebook)
+        if all(
+            notes.contains_phrase(notes.note_words(note), phrase) for phrase in phrases
+        )
+    ]
+    assert [note.offset for note in notes.search_notes(notebook, query)] == wanted
+
+
+def test_search_index_follows_appends(notebook):
+    assert list(notes.search_notes(notebook, "zyzzyva")) == []
+    notes.append_notes(notebook, ["2030-01-01 09:30:00--misc::a zyzzyva flew by"])
+    found = notes.search_notes(notebook, '"zyzzyva flew"', topics=["MISC"])
+    assert [note.body for note in found] == [("a zyzzyva flew by",)]
+
+
+@pytest.mark.parametrize(
+    "argv, destination",
+    [
+        (["-t", "py"], None),
+        (["--profile"], "text"),
+        (["--profile", "json"], "json"),
+        (["--profile=json"], "json"),
+        (["--prof", "out.json"], "out.json"),
+        (["--profile", "-t", "py"], "text"),
+    ],
+)
+def test_profile_flag(argv, destination):
+    assert notes.profile_flag(argv) == destination
+
+
+def test_note_store_backends_are_complete(tmp_path):
+    assert isinstance(notes.open_store(str(tmp_path / "a.txt")), notes.TextStore)
+    assert isinstance(notes.open_store(str(tmp_path / "a.db")), notes.SqliteStore)
+
+    class Partial(notes.NoteStore):
+        def notes(self, linebreak=";"):
+            return iter(())
+
+    with pytest.raises(TypeError):
+        Partial(str(tmp_path / "b.txt"))
+
+
+def test_import_converts_utc_offsets_to_local_time():
+    record = '{{"timestamp": "{}", "topics": ["py"], "body": "x"}}'
+    utc = notes.normalize_record(record.format("2021-03-01T09:30:00+00:00"))
+    east = notes.normalize_record(record.format("2021-03-01T11:30:00+02:00"))
+    local = datetime(2021, 3, 1, 9, 30, tzinfo=timezone.utc).astimezone()
+    assert utc == east == f"{local:%Y-%m-%d %H:%M:%S}--PY::x"
+    naive = notes.normalize_record(record.format("2021-03-01T09:30:00"))
+    assert naive == "2021-03-01 09:30:00--PY::x"
+
+
+def test_time_range_matches_linear_filter(notebook):
+    with open(notebook, "a") as f:  # lines without a timestamp are skipped
+        f.write("not a note\n\n2030-01-01 00:00:00--MISC::last\n")
+    every = list(notes.get_notes(notebook))
+    stamps = sorted({note.timestamp for note in every})
+    bounds = [None, "1999-01-01", stamps[0], stamps[1234], "2015-03-01", "2099-01-01"]
+    for since in bounds:
+        for until in bounds:
+            wanted = [note.offset for note in notes.within(every, since, until)]
+            found = notes.open_store(notebook).between(since, until)
+            assert [note.offset for note in found] == wanted, (since, until)
+
+
+def test_parse_when():
+    now = datetime(2021, 3, 8, 9, 30)
+    assert notes.parse_when("7d", now=now) == "2021-03-01 09:30:00"
+    assert notes.parse_when("12h", now=now) == "2021-03-07 21:30:00"
+    assert notes.parse_when("yesterday", now=now) == "2021-03-07 00:00:00"
+    assert notes.parse_when("2021-03-01") == "2021-03-01 00:00:00"
+    assert notes.parse_when("2021/03/01", end=True) == "2021-03-02 00:00:00"
+    assert notes.parse_when("2021-03-01 09:30") == "2021-03-01 09:30:00"
+    with pytest.raises(ValueError, match="soon"):
+        notes.parse_when("soon")
+
+
+def test_archive_keeps_queries_and_lines(notebook):
+    store = notes.open_store(notebook)
+    before = list(store.lines())
+    topics = [topic_names(3)[-1]]
+    queries = {
+        "notes": lambda: list(store.notes()),
+        "by_topics": lambda: list(store.by_topics(topics)),
+        "between": lambda: list(store.between("2015-02-01", "2015-06-01", topics)),
+        "search": lambda: list(store.search('"deploy the"')),
+        "stats": store.stats,
+        "tags": store.tags,
+    }
+    wanted = {name: query() for name, query in queries.items()}
+    archived = notes.archive_notes(store, "2015-05-01 00:00:00")
+    assert archived and len(notes.list_segments(notebook)) > 1
+    assert list(store.lines()) == before
+    assert len(list(store.lines(archived=False))) == len(before) - archived
+    for name, query in queries.items():
+        found = query()
+        if name in ("notes", "by_topics", "between", "search"):  # archived: no offset
+            found = [(n.timestamp, n.topics, n.body) for n in found]
+            wanted[name] = [(n.timestamp, n.topics, n.body) for n in wanted[name]]
+        assert found == wanted[name], name
+
+
+def test_backup_after_archive_covers_the_notes_file_only(notebook):
+    import gzip
+
+    store = notes.open_store(notebook)
+    notes.commit_notes(store, ["2030-01-01 09:30:00--MISC::first"], {})
+    archived = notes.archive_notes(store, "2015-05-01 00:00:00")
+    notes.commit_notes(store, ["2030-01-02 09:30:00--MISC::second"], {})
+    live = list(store.lines(archived=False))
+    manifest = notes.load_backup_manifest(notebook)
+    snapshot = manifest["generations"][-1]["name"]  # full: archiving changed the file
+    with gzip.open(
+        os.path.join(notes.backup_dir(notebook), f"{snapshot}.gz"), "rt"
+    ) as f:
+        assert [line.rstrip("\n") for line in f] == live[:-1]
+    every = list(store.lines())
+    notes.restore_notes(store)
+    assert list(store.lines(archived=False)) == live
+    assert list(store.lines()) == every
+    assert archived == len(every) - len(live)
+
+
+def test_segment_copies_sort_after_the_first(tmp_path):
+    p = str(tmp_path / "notes.txt")
+    os.makedirs(notes.archive_dir(p))
+    month = [f"2020-01-0{day} 09:30:00--MISC::note {day}" for day in range(1, 4)]
+    later = ["2020-01-05 09:30:00--MISC::later"]
+    written = [notes.write_segment(p, lines) for lines in (month, month, month, later)]
+    assert notes.list_segments(p) == written
+
+
+def test_notebooks_refuse_new_notes(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(notes, "INIT_FILE", str(tmp_path / "notes_init.ini"))
+    monkeypatch.setattr("sys.argv", ["notes.py", "--notebooks", "a.txt", "-n", "x"])
+    with pytest.raises(SystemExit) as exit_info:
+        notes.process_init()
+    assert exit_info.value.code == 2
+    assert "--notebooks only reads notes" in capsys.readouterr().err
+
+
+def test_text_height():
+    assert notes.text_height("\x1b[36m    >>\x1b[97m\tdeploy\n", 80) == 1
+    assert notes.text_height("\n" + "x" * 81 + "\n\x1b[39m\n", 80) == 4
+    assert notes.text_height("\t" + "x" * 72, 80) == 1
+
+
+def test_note_height_matches_the_rendered_note(notebook):
+    for note in list(notes.get_notes(notebook))[:500]:
+        rendered = notes.render_note(note, {})
+        for columns in (20, 80, 120):
+            assert notes.note_height(note, columns) == notes.text_height(
+                rendered, columns
+            )
+    for fragment in OVERLAPPING + list(generate_fragments(200)):
+        note = notes.parse_note(f"2021-03-01 09:30:00--PY, A, B, C, D, E::{fragment}")
+        if note is not None:  # markup is counted as text: never too short
+            rendered = notes.render_note(note, {})
+            assert notes.note_height(note, 20) >= notes.text_height(rendered, 20)
+
+
+def test_pager_fills_pages(notebook):
+    every = list(notes.get_notes(notebook))[:300]
+    rendered = {note.offset: notes.render_note(note, {}) for note in every}
+    pager = notes.Pager(every, lambda note: rendered[note.offset], 40, 60)
+    try:
+        shown = []
+        while pager.page(len(shown)).result() is not None:
+            shown.append(pager.page(len(shown)).result())
+        assert "".join(shown) == "".join(rendered[note.offset] for note in every)
+        assert not pager.more(len(shown) - 1)
+    finally:
+        pager.close()
+    heights = [[notes.note_height(note, 60) for note in page] for page in pager.pages]
+    for page, following in zip(heights, heights[1:] + [[]]):
+        assert sum(page) <= 40 or len(page) == 1  # a note taller than the screen
+        if following:  # the next note did not fit
+            assert sum(page) + following[0] > 40
+
+
+def test_pager_renders_only_the_pages_shown(notebook):
+    calls = []
+
+    def render(note):
+        calls.append(note)
+        return notes.render_note(note, {})
+
+    pager = notes.Pager(notes.get_notes(notebook), render, 40, 80)
+    try:
+        pager.page(0).result()
+        assert pager.more(0)
+        assert calls == pager.pages[0]  # not the note that did not fit
+        far = pager.last(200)
+        assert far == 200 and pager.more(far)
+        pager.page(far).result()
+        assert calls == pager.pages[0] + pager.pages[far]
+    finally:
+        pager.close()
+
+
+LOOP_CHILD = """
+import sys
+import bench_notes, notes
+with bench_notes.notes_sandbox(sys.argv[1]):
+    sys.stdout = sys.__stdout__  # the prompts tell the test where the loop is
+    sys.argv = ["notes.py", "-f", "notes.txt", "-l"]
+    notes.main()
+"""
+
+
+@pytest.mark.skipif(os.name == "nt", reason="signals can not be handled")
+@pytest.mark.parametrize("signal_name", ["SIGTERM", "SIGHUP"])
+def test_loop_mode_saves_every_note_on_signal(tmp_path, signal_name):
+    env = dict(os.environ, NOTES_SOCKET=str(tmp_path / "no.sock"))
+    child = subprocess.Popen(
+        [sys.executable, "-c", LOOP_CHILD, str(tmp_path)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdin=subprocess.PIPE,  # left open: the loop is waiting at a prompt
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    try:
+        child.stdin.write(b"work\nfirst\nhome\nsecond\n")
+        child.stdin.flush()
+        prompts = 0
+        while prompts < 3:  # both notes queued, well before they are due
+            line = child.stdout.readline()
+            assert line, child.communicate()[1].decode()
+            prompts += line.startswith(b"Enter comma-separated topics")
+        child.send_signal(getattr(signal, signal_name))
+        err = child.communicate(timeout=20)[1].decode()
+    finally:
+        child.kill()
+    assert child.returncode == 0, err
+    assert "Fatal Python error" not in err
+    saved = (tmp_path / "notes.txt").read_text().splitlines()
+    assert [line.split("--", 1)[1] for line in saved] == ["work::first", "home::second"]
+
+
+def test_legacy_file_is_migrated_once(notebook, monkeypatch):
+    with open(notebook) as f:
+        journal = f.read().splitlines()
+    with open(notebook, "w") as f:  # newest first, as older versions wrote it
+        f.writelines(line + "\n" for line in reversed(journal))
+    locked = notes.notes_lock
+
+    @contextmanager
+    def migrated_meanwhile(p):  # another process wins the race for the lock
+        monkeypatch.setattr(notes, "notes_lock", locked)
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import notes, sys; notes.ensure_journal(sys.argv[1])",
+                p,
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        )
+        with locked(p):
+            yield
+
+    monkeypatch.setattr(notes, "notes_lock", migrated_meanwhile)
+    assert not notes.ensure_journal(notebook)
+    with open(notebook) as f:
+        assert f.read().splitlines() == journal
+    assert not notes.ensure_journal(notebook)
+    with open(notebook, "w") as f:
+        f.writelines(line + "\n" for line in reversed(journal))
+    assert notes.ensure_journal(notebook)
+    with open(notebook) as f:
+        assert f.read().splitlines() == journal
+
+
+def test_append_ends_a_hand_edited_last_line(notebook):
+    notes.load_index(notebook, "topics")
+    with open(notebook, "a") as f:
+        f.write("2030-01-01 09:30:00--MISC::no line break")
+    notes.append_notes(notebook, ["2030-01-02 09:30:00--MISC::appended"])
+    every = list(notes.get_notes(notebook))
+    assert [note.body for note in every[:2]] == [("appended",), ("no line break",)]
+    found = notes.get_notes_by_topics(notebook, ["misc"])
+    assert [note.offset for note in found] == [
+        note.offset for note in every if "MISC" in note.topics
+    ]
+
+
+def test_restore_after_merging_import_keeps_time_order(notebook):
+    store = notes.open_store(notebook)
+    notes.commit_notes(store, ["2030-01-01 09:30:00--MISC::backed up"], {})
+    older = ["2015-02-01 09:30:00--MISC::imported", "2001-01-01 00:00:00--MISC::x"]
+    assert notes.import_notes(store, older, {})
+    notes.commit_notes(store, ["2030-01-02 09:30:00--MISC::after"], {})
+    every = list(store.lines())
+    assert every == sorted(every, key=lambda line: line[:19])
+    notes.restore_notes(store)
+    assert list(store.lines()) == every
+    found = store.between("2015-02-01", "2015-02-02")
+    assert "imported" in [thought for note in found for thought in note.body]
+
+
+def test_redundancy_mirrors_each_note_once(notebook, tmp_path):
+    mirror = str(tmp_path / "redundancy.txt")
+    with open(notebook) as f:
+        journal = f.read().splitlines()
+    keys = {notes.redundancy_key(line): line for line in reversed(journal)}
+    mirrored = [line for line in journal if keys[notes.redundancy_key(line)] == line]
+    notes.ensure_redundancy(mirror, notebook)
+    notes.ensure_redundancy(mirror, notebook)
+    with open(mirror) as f:
+        assert f.read().splitlines() == mirrored
+    added = "2030-01-01 09:30:00--MISC::added"
+    notes.append_notes(notebook, [added, journal[0]])  # a copy is not mirrored
+    notes.ensure_redundancy(mirror, notebook)
+    with open(mirror) as f:
+        assert f.read().splitlines() == mirrored + [added]
+    other = str(tmp_path / "other.txt")
+    notes.append_notes(other, [journal[5], "2030-01-02 09:30:00--MISC::other"])
+    notes.ensure_redundancy(mirror, other)
+    with open(mirror) as f:
+        assert f.read().splitlines()[-2:] == [added, "2030-01-02 09:30:00--MISC::other"]
+
+
+def test_styles_are_read_once_and_only_new_keywords_written(tmp_path, monkeypatch):
+    p = tmp_path / "styles.ini"
+    p.write_text("; comment\nPY=<FORE-3afa00>\n")
+    registry = notes.StyleRegistry(str(p), check_interval=3600)
+    reads = []
+    read = registry._read
+    monkeypatch.setattr(registry, "_read", lambda: reads.append(1) or read())
+    for _ in range(100):
+        assert registry.styles == {"PY": "<FORE-3afa00>"}
+    assert len(reads) == 1
+    registry.register("PY")
+    registry.register("OPS")
+    with open(p, "a") as f:  # another process, no line break at the end
+        f.write("DOCS=<FORE-ff0000>")
+    registry.flush()
+    written = [
+        "; comment",
+        "PY=<FORE-3afa00>",
+        "DOCS=<FORE-ff0000>",
+        "OPS=<FORE-fffb00>",
+    ]
+    assert p.read_text().splitlines() == written
+    registry.flush()  # nothing new
+    assert p.read_text().splitlines() == written
+    assert registry.load()["DOCS"] == "<FORE-ff0000>"
+
+
+DAEMON_CHILD = """
+import sys
+import bench_notes, notes
+with bench_notes.notes_sandbox(sys.argv[1]):
+    notes.serve(sys.argv[2], warm=[sys.argv[3]])
+"""
+
+CLIENT_CHILD = """
+import sys
+import notes
+sys.exit(0 if notes.forward_to_daemon(sys.argv[1:]) else 3)
+"""
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets")
+def test_daemon_answers_commands(notebook, tmp_path):
+    sock = str(tmp_path / "notes.sock")
+    env = dict(os.environ, NOTES_SOCKET=sock)
+    here = os.path.dirname(os.path.abspath(__file__))
+    daemon = subprocess.Popen(
+        [sys.executable, "-c", DAEMON_CHILD, str(tmp_path), sock, notebook],
+        cwd=here,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    try:
+        for _ in range(200):
+            if os.path.exists(sock) or daemon.poll() is not None:
+                break
+            time.sleep(0.05)
+        assert os.path.exists(sock), daemon.communicate()[1].decode()
+
+        def client(*argv):
+            return subprocess.run(
+                [sys.executable, "-c", CLIENT_CHILD, "-f", notebook, *argv],
+                cwd=here,
+                capture_output=True,
+                env=env,
+            )
+
+        added = client("-t", "daemoned", "-n", "through the daemon")
+        assert added.returncode == 0, added.stderr.decode()
+        found = client("-t", "daemoned")
+        assert found.returncode == 0, found.stderr.decode()
+        assert b"through the daemon" in found.stdout
+        assert list(notes.get_notes(notebook))[0].body == ("through the daemon",)
+        assert client("-l").returncode == 3  # the loop prompts: runs in the client
+    finally:
+        daemon.send_signal(signal.SIGINT)
+        daemon.communicate(timeout=20)
+    assert daemon.returncode == 0
+    assert not os.path.exists(sock)
+
+
+def test_backup_generations_roll_and_restore(notebook):
+    store = notes.open_store(notebook)
+    d = {"default_backup_snapshot_every": 2, "default_backup_retention": 2}
+    states = []
+    for day in range(1, 8):
+        notes.commit_notes(store, [f"2030-01-0{day} 09:30:00--MISC::day {day}"], d)
+        states.append(list(store.lines()))
+    generations = notes.load_backup_manifest(notebook)["generations"]
+    assert [g["records"] for g in generations] == [2, 1]
+    folder = notes.backup_dir(notebook)
+    assert sorted(os.listdir(folder)) == sorted(
+        [f"{g['name']}{ext}" for g in generations for ext in (".gz", ".wal")]
+        + ["manifest.json"]
+    )
+    with open(os.path.join(folder, f"{generations[-1]['name']}.wal")) as f:
+        assert f.read() == "2030-01-07 09:30:00--MISC::day 7\n"
+    with open(notebook, "a") as f:  # lost by a bad edit, say
+        f.write("2030-02-01 09:30:00--MISC::not backed up\n")
+    assert notes.restore_notes(store) == generations[-1]["name"]
+    assert list(store.lines()) == states[-1]
+    assert notes.restore_notes(store, generations[0]["name"]) == generations[0]["name"]
+    assert list(store.lines()) == states[-2]
+
+
+def test_write_behind_batches_loop_notes(monkeypatch):
+    import asyncio
+
+    batches, failures = [], [OSError("disk full")]
+
+    def commit(store, batch, d):
+        if failures:
+            raise failures.pop()
+        batches.append(list(batch))
+
+    monkeypatch.setattr(notes, "commit_notes", commit)
+    monkeypatch.setattr(notes, "ensure_redundancy", lambda *paths: None)
+    store = SimpleNamespace(path="notes.txt")  # only the calls above use it
+
+    async def loop():
+        queue = asyncio.Queue()
+        writer = asyncio.create_task(
+            notes.write_behind(queue, store, {}, max_notes=3, max_delay=0.5)
+        )
+        for i in range(7):
+            queue.put_nowait(f"note {i}")
+        await asyncio.sleep(0.1)  # full batches go at once; a failed one again
+        assert batches == [
+            ["note 0", "note 1", "note 2"],
+            ["note 3", "note 4", "note 5"],
+        ]
+        await asyncio.sleep(0.6)  # the last note is due
+        assert batches[2:] == [["note 6"]]
+        queue.put_nowait("note 7")
+        queue.put_nowait(None)  # what is left goes when the queue closes
+        await writer
+        assert batches[3:] == [["note 7"]]
+
+    asyncio.run(loop())
+    assert not failures
+
+
+def test_stats_match_a_plain_count(notebook, tmp_path):
+    def counted(every):
+        topics, days = {}, {}
+        for note in every:
+            days[note.timestamp[:10]] = days.get(note.timestamp[:10], 0) + 1
+            for topic in note.topics:
+                stamps = topics.setdefault(topic, [])
+                stamps.append(note.timestamp)
+        weeks, months = {}, {}
+        for day, count in days.items():
+            year, week, _ = datetime.fromisoformat(day).isocalendar()
+            weeks[f"{year}-W{week:02d}"] = weeks.get(f"{year}-W{week:02d}", 0) + count
+            months[day[:7]] = months.get(day[:7], 0) + count
+        return {
+            "notes": sum(days.values()),
+            "topics": {
+                topic: {"notes": len(s), "first": min(s), "last": max(s)}
+                for topic, s in topics.items()
+            },
+            "day": days,
+            "week": weeks,
+            "month": months,
+        }
+
+    def report(stats):
+        assert list(stats["day"]) == sorted(stats["day"])
+        return {key: stats[key] for key in ("notes", "topics", "day", "week", "month")}
+
+    store = notes.open_store(notebook)
+    wanted = counted(notes.get_notes(notebook))
+    assert report(store.stats()) == wanted  # scanned: no index yet
+    notes.load_index(notebook, "topics")
+    assert report(store.stats()) == wanted  # from the topic index
+    notes.archive_notes(store, "2015-05-01 00:00:00")
+    assert report(store.stats()) == wanted  # segments from their footers
+    db = notes.open_store(str(tmp_path / "notes.db"))
+    notes.export_notes(store, db)
+    assert report(db.stats()) == wanted
+
+
+def test_render_cache_reuses_renders_until_styles_change(notebook, monkeypatch):
+    every = list(notes.get_notes(notebook))[:200]
+    for note in every:  # topics become keywords as they are rendered
+        notes.render_note(note, {})
+    wanted = [notes.render_note(note, {}) for note in every]
+    render = notes.cached_renderer({})
+    assert [render(note) for note in every] == wanted
+    notes.RENDER_CACHE.close()  # written out, as on exit
+
+    rendered = []
+    render_note = notes.render_note
+    monkeypatch.setattr(
+        notes,
+        "render_note",
+        lambda note, d: rendered.append(note) or render_note(note, d),
+    )
+    assert [render(note) for note in every] == wanted
+    assert rendered == []  # all from the cache
+    with open(notes.STYLES_PATH, "a") as f:
+        f.write("DEPLOY=<FORE-ff0000>\n")
+    notes.STYLES.load()
+    again = [render(note) for note in every]
+    assert len(rendered) == len(every)  # new styles: rendered afresh
+    assert any("\x1b[31mDEPLOY" in text for text in again)
+    assert again == [render_note(note, {}) for note in every]
+    uncached = notes.cached_renderer({"default_render_cache_mb": 0})
+    assert uncached(every[0]) == again[0]